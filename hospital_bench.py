@@ -0,0 +1,377 @@
+import argparse
+import datetime
+import json
+import os
+import random
+import subprocess
+import time
+import tracemalloc
+
+import hospital_db
+from hospital_db import Appointment, Department, Patient, PatientOf, Practitioner, Reception
+
+# size of the synthetic hospital and number of timed runs per operation, can be overridden on the command line
+bench_settings = {'shards': 2,
+                  'departments': 10,
+                  'practitioners': 20,  # per department
+                  'receptionists': 3,  # per department, plus one without appointments that is moved between databases
+                  'patients': 100,  # per department, PatientIDs have 4 digits so at most 9000 in total
+                  'appointments': 20000,
+                  'days': 60,  # appointments are spread over this many days from first_day
+                  'repeat': 50,
+                  'seed': 1,
+                  'data_dir': 'bench_data',
+                  'output': 'bench_results.json'}
+
+first_day = datetime.date(2024, 1, 1)
+
+
+def generate_hospital(settings):
+    """
+    Function to build the rows of a synthetic hospital with a fixed random seed, so every run gets the same data.
+    :return: dict of table name to the list of row dicts, in the order they have to be imported
+    """
+    rng = random.Random(settings['seed'])
+    departments = [{'DepartmentID': dept_id, 'DepartmentName': f"Department {dept_id}", 'TotalRooms': 50}
+                   for dept_id in range(1, settings['departments'] + 1)]
+    practitioners = []
+    receptionists = []
+    patients = []
+    for dept in departments:
+        dept_id = dept['DepartmentID']
+        for number in range(settings['practitioners']):
+            employee_id = 100000 + len(practitioners)
+            practitioners.append({'EmployeeID': employee_id, 'LastName': f"Last{employee_id}",
+                                  'FirstName': f"First{employee_id}", 'LicenseNumber': len(practitioners) + 1,
+                                  'Title': 'Doctor', 'DepartmentID': dept_id, 'Specialty': 'General'})
+        for number in range(settings['receptionists']):
+            employee_id = 200000 + len(receptionists)
+            receptionists.append({'EmployeeID': employee_id, 'LastName': f"Last{employee_id}",
+                                  'FirstName': f"First{employee_id}", 'DepartmentID': dept_id})
+        for number in range(settings['patients']):
+            patient_id = 1000 + len(patients)
+            patients.append({'PatientID': patient_id, 'LastName': rng.choice(['Brown', 'Smith', 'Lee', 'Kim']),
+                             'FirstName': f"First{patient_id}", 'DOB': '1990-01-01', 'Gender': 'Female',
+                             'Insurance': 'Aetna', 'PastProcedures': '', 'Notes': '', 'DepartmentID': dept_id})
+    if len(patients) > 9000:
+        raise ValueError("At most 9000 patients fit the 4 digit PatientID.")
+
+    staff = {dept['DepartmentID']: ([], []) for dept in departments}
+    for practitioner in practitioners:
+        staff[practitioner['DepartmentID']][0].append(practitioner['EmployeeID'])
+    for receptionist in receptionists:
+        staff[receptionist['DepartmentID']][1].append(receptionist['EmployeeID'])
+    # staff that appointments refer to can't be moved to another database
+    for dept in departments:
+        employee_id = 200000 + len(receptionists)
+        receptionists.append({'EmployeeID': employee_id, 'LastName': f"Last{employee_id}",
+                              'FirstName': f"First{employee_id}", 'DepartmentID': dept['DepartmentID']})
+    slots = hospital_db.slots_per_day()
+    taken = set()
+    appointments = []
+    while len(appointments) < settings['appointments'] and len(taken) < len(practitioners) * settings['days'] * slots:
+        patient = rng.choice(patients)
+        practitioner_ids, receptionist_ids = staff[patient['DepartmentID']]
+        key = (rng.choice(practitioner_ids), first_day + datetime.timedelta(days=rng.randrange(settings['days'])),
+               hospital_db.slot_time(rng.randrange(slots)))
+        if key in taken:
+            continue
+        taken.add(key)
+        appointments.append({'ReceptionistID': rng.choice(receptionist_ids), 'PatientID': patient['PatientID'],
+                             'PractitionerID': key[0], 'DepartmentID': patient['DepartmentID'],
+                             'AppointmentDate': key[1].isoformat(), 'AppointmentTime': key[2].isoformat(),
+                             'Notes': 'Synthetic'})
+    return {'departments': departments, 'receptionists': receptionists, 'practitioners': practitioners,
+            'patients': patients, 'appointments': appointments}
+
+
+def load_hospital(settings, hospital, use_mysql=False):
+    """Point hospital_db at fresh SQLite files (or the MySQL databases in engine_urls), create the tables and bulk
+    import the synthetic hospital."""
+    os.makedirs(settings['data_dir'], exist_ok=True)
+    if not use_mysql:
+        hospital_db.engine_urls = {}
+        for shard in range(settings['shards']):
+            path = os.path.join(settings['data_dir'], f"bench{shard + 1}.sqlite")
+            if os.path.exists(path):
+                os.remove(path)
+            hospital_db.engine_urls[shard] = f"sqlite:///{path}"
+    hospital_db.reset_registry()
+    hospital_db.get_registry().init_schema()
+    for table_name, rows in hospital.items():
+        path = os.path.join(settings['data_dir'], f"{table_name}.jsonl")
+        with open(path, 'w') as file:
+            for row in rows:
+                file.write(json.dumps(row) + '\n')
+        imported, failed = hospital_db.bulk_import(table_name, path, 5000)
+        if failed:
+            raise Exception(f"Importing {table_name} failed: {failed[:3]}")
+
+
+class BenchState:
+    """Data shared by the benchmarked operations: the generated ids and a random generator."""
+
+    def __init__(self, settings, hospital):
+        self.rng = random.Random(settings['seed'] + 1)
+        self.departments = [row['DepartmentID'] for row in hospital['departments']]
+        self.practitioners = hospital['practitioners']
+        # the receptionists without appointments come after the others
+        with_appointments = len(hospital['departments']) * settings['receptionists']
+        self.receptionists = hospital['receptionists'][:with_appointments]
+        self.movable_receptionists = hospital['receptionists'][with_appointments:]
+        self.patients = hospital['patients']
+        self.appointment_ids = list(range(1, 100))  # AppointmentIDs are per database, the first ones exist in all
+        self.added = []  # appointments added by add_appointment, deleted again by delete_appointment
+        self.next_day = first_day + datetime.timedelta(days=settings['days'] + 1)
+        self.schedule_day = first_day + datetime.timedelta(days=settings['days'] + 10000)  # apart from next_day
+
+    def sessions(self):
+        return hospital_db.get_registry().get_sessions(twophase=False)
+
+
+def _consume(rows_and_count):
+    """Read a streamed getter result to the end."""
+    rows, count = rows_and_count
+    return sum(1 for row in rows)
+
+
+def _with_sessions(state, function):
+    sessions = state.sessions()
+    try:
+        return function(sessions)
+    finally:
+        for session in sessions:
+            session.close()
+
+
+def bench_get_department(state):
+    return _with_sessions(state, lambda sessions: _consume(Department.get_department(
+        sessions, {'DepartmentID': state.rng.choice(state.departments)}, page_size=hospital_db.stream_page_size)))
+
+
+def bench_get_appointment_by_date(state):
+    day = first_day + datetime.timedelta(days=state.rng.randrange(7))
+    return _with_sessions(state, lambda sessions: _consume(Appointment.get_appointment(
+        sessions, {'AppointmentDate': day}, page_size=hospital_db.stream_page_size)))
+
+
+def bench_get_daily_schedule(state):
+    day = first_day + datetime.timedelta(days=state.rng.randrange(7))
+    return _with_sessions(state, lambda sessions: hospital_db.DailySchedule.get_daily_schedule(
+        sessions, day, state.rng.choice(state.departments)))
+
+
+def bench_get_patient_by_last_name(state):
+    return _with_sessions(state, lambda sessions: _consume(Patient.get_patient(
+        sessions, {'LastName': 'Brown', 'DepartmentID': state.rng.choice(state.departments)},
+        page_size=hospital_db.stream_page_size)))
+
+
+def bench_get_practitioner_by_department(state):
+    return _with_sessions(state, lambda sessions: _consume(Practitioner.get_practitioner(
+        sessions, {'DepartmentID': state.rng.choice(state.departments)}, page_size=hospital_db.stream_page_size)))
+
+
+def bench_get_patients_of(state):
+    practitioner_id = state.rng.choice(state.practitioners)['EmployeeID']
+    return _with_sessions(state, lambda sessions: PatientOf.get_patients_of(sessions, practitioner_id))
+
+
+def bench_get_practitioners_for(state):
+    patient_id = state.rng.choice(state.patients)['PatientID']
+    return _with_sessions(state, lambda sessions: PatientOf.get_practitioners_for(sessions, patient_id))
+
+
+def bench_find_free_slots(state):
+    return _with_sessions(state, lambda sessions: Appointment.find_free_slots(
+        sessions, first_day, first_day + datetime.timedelta(days=6),
+        department_id=state.rng.choice(state.departments)))
+
+
+def bench_add_appointment(state):
+    # a day after the generated appointments, so every slot is free
+    patient = state.rng.choice(state.patients)
+    practitioner = next(row for row in state.practitioners if row['DepartmentID'] == patient['DepartmentID'])
+    receptionist = next(row for row in state.receptionists if row['DepartmentID'] == patient['DepartmentID'])
+    appointment_time = hospital_db.slot_time(len(state.added) % hospital_db.slots_per_day())
+    if appointment_time == hospital_db.slot_time(0):
+        state.next_day += datetime.timedelta(days=1)
+    values = {'ReceptionistID': receptionist['EmployeeID'], 'PatientID': patient['PatientID'],
+              'PractitionerID': practitioner['EmployeeID'], 'DepartmentID': patient['DepartmentID'],
+              'AppointmentDate': state.next_day, 'AppointmentTime': appointment_time, 'Notes': 'Benchmark'}
+    session = hospital_db.get_registry().get_session(hospital_db.hash_department(patient['DepartmentID']))
+    try:
+        result = Appointment.add_appointment(session, values)
+    finally:
+        session.close()
+    state.added.append(values)
+    return result
+
+
+def bench_modify_appointment(state):
+    appointment_id = state.rng.choice(state.appointment_ids)
+    return _with_sessions(state, lambda sessions: Appointment.modify_appointment(
+        sessions, {'AppointmentID': appointment_id}, {'Notes': f"Changed {time.time()}"}))
+
+
+def bench_modify_patient(state):
+    patient_id = state.rng.choice(state.patients)['PatientID']
+    return _with_sessions(state, lambda sessions: Patient.modify_patient(
+        sessions, {'PatientID': patient_id}, {'Insurance': state.rng.choice(['Aetna', 'Kaiser'])}))
+
+
+def bench_modify_receptionist_cross_shard(state):
+    # move a receptionist without appointments to a department in another database, the next run may move it again
+    receptionist = state.rng.choice(state.movable_receptionists)
+    shard = hospital_db.hash_department(receptionist['DepartmentID'])
+    targets = [dept_id for dept_id in state.departments if hospital_db.hash_department(dept_id) != shard]
+    if not targets:
+        return None
+    new_dept_id = state.rng.choice(targets)
+    result = _with_sessions(state, lambda sessions: Reception.modify_receptionist(
+        sessions, {'EmployeeID': receptionist['EmployeeID']}, {'DepartmentID': new_dept_id}))
+    receptionist['DepartmentID'] = new_dept_id
+    return result
+
+
+def bench_schedule_appointments(state):
+    # 50 requests for the same morning slot of one day, so most of them clash and are reslotted
+    state.schedule_day += datetime.timedelta(days=1)
+    dept_id = state.rng.choice(state.departments)
+    patients = [row for row in state.patients if row['DepartmentID'] == dept_id]
+    practitioners = [row for row in state.practitioners if row['DepartmentID'] == dept_id]
+    receptionist = next(row for row in state.receptionists if row['DepartmentID'] == dept_id)
+    rows = [(number, {'ReceptionistID': receptionist['EmployeeID'],
+                      'PatientID': state.rng.choice(patients)['PatientID'],
+                      'PractitionerID': practitioners[number % len(practitioners)]['EmployeeID'],
+                      'DepartmentID': dept_id, 'AppointmentDate': state.schedule_day,
+                      'AppointmentTime': hospital_db.slot_time(0), 'Notes': 'Benchmark'}) for number in range(50)]
+    return hospital_db.schedule_appointments(rows, on_conflict='reslot')
+
+
+def bench_delete_appointment(state):
+    if not state.added:
+        return 0
+    values = state.added.pop()
+    return _with_sessions(state, lambda sessions: Appointment.delete_appointment(sessions, {
+        'PractitionerID': values['PractitionerID'], 'AppointmentDate': values['AppointmentDate'],
+        'AppointmentTime': values['AppointmentTime']}))
+
+
+# operations in the order they are run, the deletes undo the adds
+bench_operations = {'get_department': bench_get_department,
+                    'get_appointment_by_date': bench_get_appointment_by_date,
+                    'get_daily_schedule': bench_get_daily_schedule,
+                    'get_patient_by_last_name': bench_get_patient_by_last_name,
+                    'get_practitioner_by_department': bench_get_practitioner_by_department,
+                    'get_patients_of': bench_get_patients_of,
+                    'get_practitioners_for': bench_get_practitioners_for,
+                    'find_free_slots': bench_find_free_slots,
+                    'add_appointment': bench_add_appointment,
+                    'modify_appointment': bench_modify_appointment,
+                    'modify_patient': bench_modify_patient,
+                    'modify_receptionist_cross_shard': bench_modify_receptionist_cross_shard,
+                    'schedule_appointments': bench_schedule_appointments,
+                    'delete_appointment': bench_delete_appointment}
+
+
+def _percentile(sorted_values, fraction):
+    return sorted_values[min(int(fraction * len(sorted_values)), len(sorted_values) - 1)]
+
+
+def run_benchmark(state, repeat, operations=None):
+    """
+    Function to time each operation repeat times, then run it once more under tracemalloc for its peak memory,
+    since tracing slows the timed runs down. The statements of the timed runs are counted with a hospital_db
+    profile, which also sees those of the scatter-gather threads.
+    :return: dict of operation name to its runs, throughput, p50/p99 latency in milliseconds, average statement
+    count and peak memory in KiB
+    """
+    results = {}
+    for name, operation in (operations or bench_operations).items():
+        latencies = []
+        profile = hospital_db.begin_profile(name, collect=True)
+        started = time.perf_counter()
+        try:
+            for run in range(repeat):
+                run_started = time.perf_counter()
+                operation(state)
+                latencies.append(time.perf_counter() - run_started)
+        finally:
+            hospital_db.end_profile(profile)
+        elapsed = time.perf_counter() - started
+        statements = sum(stats.statements for stats in profile.shards.values())
+
+        tracemalloc.start()
+        operation(state)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        latencies.sort()
+        results[name] = {'runs': repeat,
+                         'ops_per_second': round(repeat / elapsed, 2) if elapsed else None,
+                         'p50_ms': round(_percentile(latencies, 0.5) * 1000, 3),
+                         'p99_ms': round(_percentile(latencies, 0.99) * 1000, 3),
+                         'statements_per_op': round(statements / repeat, 2),
+                         'peak_memory_kib': round(peak / 1024, 1)}
+    return results
+
+
+def git_commit():
+    """Return the current git commit of the repository, None outside a git checkout."""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(previous, current):
+    """Print the change of p50 latency and statement count of each operation against an earlier results file."""
+    print(f"Compared with commit {previous.get('commit')}:")
+    for name, result in current['operations'].items():
+        before = previous.get('operations', {}).get(name)
+        if not before:
+            continue
+        ratio = result['p50_ms'] / before['p50_ms'] if before['p50_ms'] else float('inf')
+        print(f"{name}: p50 {before['p50_ms']} -> {result['p50_ms']} ms ({ratio:.2f}x), statements "
+              f"{before['statements_per_op']} -> {result['statements_per_op']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the hospital database operations on synthetic data.")
+    for key, value in bench_settings.items():
+        parser.add_argument(f"--{key.replace('_', '-')}", type=type(value), default=value)
+    parser.add_argument('--mysql', action='store_true',
+                        help="use the empty test databases in hospital_db.engine_urls instead of SQLite files")
+    parser.add_argument('--compare', help="earlier results file to compare with")
+    args = parser.parse_args()
+    settings = {key: getattr(args, key) for key in bench_settings}
+
+    print("Generating and importing the synthetic hospital...")
+    hospital = generate_hospital(settings)
+    load_hospital(settings, hospital, args.mysql)
+    state = BenchState(settings, hospital)
+    operations = run_benchmark(state, settings['repeat'])
+
+    results = {'commit': git_commit(),
+               'time': datetime.datetime.now().isoformat(timespec='seconds'),
+               'database': 'mysql' if args.mysql else 'sqlite',
+               'settings': settings,
+               'rows': {table_name: len(rows) for table_name, rows in hospital.items()},
+               'operations': operations}
+    with open(settings['output'], 'w') as file:
+        json.dump(results, file, indent=2)
+
+    for name, result in operations.items():
+        print(f"{name}: {result['ops_per_second']} ops/s, p50 {result['p50_ms']} ms, p99 {result['p99_ms']} ms, "
+              f"{result['statements_per_op']} statements, peak {result['peak_memory_kib']} KiB")
+    print(f"Results written to {settings['output']}.")
+    if args.compare:
+        with open(args.compare) as file:
+            compare_results(json.load(file), results)
+    hospital_db.reset_registry()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+import json
+import os
+import sys
+import urllib.request
+
+# url of a running hospital_server.py, can be overridden with the HOSPITAL_SERVER_URL environment variable
+server_url = os.environ.get('HOSPITAL_SERVER_URL', 'http://127.0.0.1:8765/rpc')
+
+
+def call(operation, params):
+    """
+    Function to send one operation to the server.
+    :param operation: the operation name, e.g. "get_patient"
+    :param params: list of the command line arguments that follow the operation
+    :return: the JSON-RPC response dict
+    """
+    request = {'jsonrpc': '2.0', 'id': 1, 'method': operation, 'params': params}
+    http_request = urllib.request.Request(server_url, data=json.dumps(request).encode('utf-8'),
+                                          headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(http_request) as http_response:
+        return json.loads(http_response.read())
+
+
+def main():
+    # same syntax as hospital_db.py, e.g. python hospital_client.py get_patient "{\"LastName\": \"Brown\"}"
+    if len(sys.argv) < 2:
+        print("Usage: python hospital_client.py [operation] [arguments]")
+        sys.exit(2)
+
+    try:
+        response = call(sys.argv[1], sys.argv[2:])
+    except OSError as e:
+        print(f"Could not reach the hospital database server at {server_url}:", e)
+        sys.exit(2)
+
+    if 'error' in response:
+        print(response['error'].get('data') or '', end='')
+        print("An error occurred on the server:", response['error']['message'])
+        sys.exit(1)
+    print(response['result']['output'], end='')
+    sys.exit(0 if response['result']['success'] else 1)
+
+
+if __name__ == "__main__":
+    main()
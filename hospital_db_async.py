@@ -0,0 +1,406 @@
+import asyncio
+import contextlib
+import sys
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.sql import select
+
+import hospital_db
+from hospital_db import Department, Appointment, Reception, Practitioner, Patient, PatientOf
+from hospital_db import ShardMap, cache_settings, cached_instance, cached_row, delete_matching_rows, hash_department, \
+    hash_department_for_write, modify_staff_in_shard, move_rows, pool_settings, route_shards, shard_settings, \
+    supports_twophase, twophase_settings
+
+# async drivers used in place of the drivers in engine_urls, e.g. pip install aiomysql (or aiosqlite for tests)
+async_drivers = {'mysql+mysqlconnector': 'mysql+aiomysql',
+                 'mysql': 'mysql+aiomysql',
+                 'sqlite': 'sqlite+aiosqlite'}
+
+
+def to_async_url(url):
+    """Return the database url with its driver replaced by the async driver from async_drivers."""
+    scheme, rest = url.split('://', 1)
+    return f"{async_drivers.get(scheme, scheme)}://{rest}"
+
+
+class AsyncShardEngineRegistry:
+    """Keeps one pooled async engine and AsyncSession factory per entry in engine_urls, the async counterpart of
+    ShardEngineRegistry. All operations of an event loop share its connections instead of a thread each."""
+
+    def __init__(self, urls=None):
+        """:param urls: dict of shard number to database url, defaults to the global engine_urls"""
+        self.urls = dict(urls if urls is not None else hospital_db.engine_urls)
+        self._engines = {}
+        self._session_factories = {}
+
+    def get_engine(self, shard):
+        """Return the pooled async engine for the given shard number, creating it on first use."""
+        if shard not in self._engines:
+            url = to_async_url(self.urls[shard])
+            options = {'pool_pre_ping': pool_settings['pool_pre_ping'],
+                       'pool_recycle': pool_settings['pool_recycle']}
+            if not url.startswith('sqlite'):  # the sqlite stand-in picks its own pool
+                options.update(pool_size=pool_settings['pool_size'], max_overflow=pool_settings['max_overflow'])
+            self._engines[shard] = create_async_engine(url, **options)
+            self._engines[shard].sync_engine.dialect.create_xid = hospital_db._create_twophase_xid
+            # the statements show up in hospital_db.metrics_text under the operation 'other'
+            hospital_db.instrument_engine(self._engines[shard].sync_engine, shard)
+        return self._engines[shard]
+
+    def get_session(self, shard, twophase=False):
+        """Return a new AsyncSession for the given shard number. Objects stay readable after a commit, since
+        reloading expired attributes would need to await. With twophase=True the session can be prepared by
+        commit_shards (only if the database supports it)."""
+        twophase = twophase and supports_twophase(self.get_engine(shard).sync_engine)
+        if (shard, twophase) not in self._session_factories:
+            self._session_factories[(shard, twophase)] = sessionmaker(
+                bind=self.get_engine(shard), class_=AsyncSession, expire_on_commit=False, twophase=twophase)
+        return self._session_factories[(shard, twophase)]()
+
+    def get_sessions(self, twophase=False):
+        """Return a list with a new AsyncSession for every shard, indexed by shard number. The sessions use two-phase
+        commit if twophase is True and twophase_settings['enabled'] is set."""
+        twophase = twophase and twophase_settings['enabled']
+        return [self.get_session(shard, twophase) for shard in sorted(self.urls)]
+
+    async def dispose(self):
+        """Close all pooled connections of every shard engine."""
+        await asyncio.gather(*(engine.dispose() for engine in self._engines.values()))
+        self._engines = {}
+        self._session_factories = {}
+
+
+# process wide async registry, created on first use
+async_registry = None
+
+
+def get_async_registry():
+    """Return the process wide async registry, creating it from engine_urls on first use."""
+    global async_registry
+    if async_registry is None:
+        async_registry = AsyncShardEngineRegistry()
+    return async_registry
+
+
+async def reset_async_registry():
+    """Dispose of the process wide async registry so the next call uses the current engine_urls."""
+    global async_registry
+    if async_registry is not None:
+        await async_registry.dispose()
+    async_registry = None
+
+
+async def refresh_shard_map():
+    """Reload the shard directory through an async session when it is stale, so that hash_department doesn't block
+    the event loop to load it. Returns the process wide shard map shared with hospital_db."""
+    if hospital_db.shard_map is None:
+        hospital_db.shard_map = ShardMap(get_async_registry().urls)
+    if hospital_db.shard_map.is_stale():
+        async with get_async_registry().get_session(shard_settings['directory_shard']) as session:
+            await session.run_sync(hospital_db.shard_map.load_directory)
+    return hospital_db.shard_map
+
+
+@contextlib.asynccontextmanager
+async def shard_sessions(twophase=False):
+    """Open an AsyncSession per database, indexed by shard number, and close them all afterwards. Writes pass
+    twophase=True so that commit_shards can commit them with two-phase commit."""
+    sessions = get_async_registry().get_sessions(twophase)
+    try:
+        yield sessions
+    finally:
+        await asyncio.gather(*(session.close() for session in sessions))
+
+
+async def gather_shards(awaitables, shards, allow_partial=False):
+    """
+    Function to await one awaitable per database concurrently, the async counterpart of scatter_gather. Every
+    awaitable is waited for, also when another one fails.
+    :param awaitables: list of awaitables, one per database
+    :param shards: the shard number of each awaitable for the messages
+    :param allow_partial: if True, databases that fail are reported and their result is None, otherwise the first
+    error is raised
+    :return: list with the result of each awaitable
+    """
+    results = await asyncio.gather(*awaitables, return_exceptions=True)
+    errors = [result for result in results if isinstance(result, Exception)]
+    if errors and (not allow_partial or len(errors) == len(results)):
+        raise errors[0]
+    for shard, result in zip(shards, results):
+        if isinstance(result, Exception):
+            print(f"Warning: database {shard + 1} could not be queried, the results are partial:", result,
+                  file=sys.stderr)
+    return [None if isinstance(result, Exception) else result for result in results]
+
+
+async def commit_shards(sessions, shards):
+    """
+    Function to commit the sessions of the given databases, the async counterpart of hospital_db.commit_shards. If
+    more than one of them has a transaction in progress and the sessions use two-phase commit, all of them are
+    prepared concurrently first, the decision to commit is logged and then they are committed concurrently, so
+    that either every database keeps the changes or none does. Otherwise the sessions are committed concurrently.
+    :param sessions: list of the sessions of all databases, indexed by shard number
+    :param shards: the shard numbers of the sessions to commit
+    """
+    active = [shard for shard in shards if sessions[shard].in_transaction()]
+    if len(active) < 2 or not all(sessions[shard].sync_session.twophase for shard in active):
+        await gather_shards([sessions[shard].commit() for shard in shards], shards)
+        return
+
+    xids = [await sessions[shard].run_sync(lambda session: session.connection().get_transaction().xid)
+            for shard in active]
+    try:
+        await gather_shards([sessions[shard].run_sync(Session.prepare) for shard in active], active)
+    except Exception:
+        # nothing was committed yet, undo the prepared transactions as well as the failed one
+        await asyncio.gather(*(sessions[shard].rollback() for shard in active), return_exceptions=True)
+        raise
+    decision_path = await asyncio.to_thread(hospital_db._log_twophase_decision, xids, 'commit')
+
+    async def commit(session):
+        await session.commit()
+        return True
+    # a database that fails now keeps its transaction prepared, recover_twophase commits it later
+    results = await gather_shards([commit(sessions[shard]) for shard in active], active, allow_partial=True)
+    if all(results):
+        hospital_db._forget_twophase_decision(decision_path)
+
+
+async def _add_row(add_method, values):
+    """Run one of the synchronous add methods with the session of the database of the row's DepartmentID."""
+    await refresh_shard_map()
+    async with get_async_registry().get_session(hash_department_for_write(values['DepartmentID'])) as session:
+        return await session.run_sync(add_method, values)
+
+
+async def _write_shards(write_function, filter_attributes_dict, *args):
+    """
+    Function to run a synchronous per-database write, e.g. delete_matching_rows, on every database that can hold
+    rows matching the filter concurrently, and commit them with commit_shards if any rows were changed.
+    :param write_function: called as write_function(session, filter_attributes_dict, *args), returns a row count
+    :return: the number of rows changed in all databases
+    """
+    await refresh_shard_map()
+    if 'DepartmentID' in filter_attributes_dict:
+        hash_department_for_write(filter_attributes_dict['DepartmentID'])
+    async with shard_sessions(twophase=True) as sessions:
+        shards = route_shards(filter_attributes_dict, len(sessions))
+        try:
+            counts = await gather_shards([sessions[shard].run_sync(write_function, filter_attributes_dict, *args)
+                                          for shard in shards], shards)
+            if any(counts):
+                await commit_shards(sessions, shards)
+            return sum(counts)
+        except Exception:
+            await asyncio.gather(*(sessions[shard].rollback() for shard in shards), return_exceptions=True)
+            raise
+
+
+async def _get_rows(model, filtering_dict):
+    """Run the query of a synchronous getter on every database that can hold matching rows concurrently and
+    return the rows of all databases with their count. Relationships that the getter doesn't load eagerly can't be
+    read from the returned rows, use department_name for the department names."""
+    await refresh_shard_map()
+    async with shard_sessions() as sessions:
+        results = await asyncio.gather(*(
+            sessions[shard].run_sync(lambda session: model._get_query(session, filtering_dict).all())
+            for shard in route_shards(filtering_dict, len(sessions))))
+    rows = [row for shard_rows in results for row in shard_rows]
+    return rows, len(rows)
+
+
+async def department_name(dept_id):
+    """Return the DepartmentName of a department through the department cache, None if it doesn't exist."""
+    await refresh_shard_map()
+    async with get_async_registry().get_session(hash_department(dept_id)) as session:
+        department = await session.run_sync(cached_row, Department, dept_id)
+    return department.DepartmentName if department else None
+
+
+# departments
+async def add_department(dept_dict):
+    """Add a department to the database it hashes to and pin it there in the shard directory, see
+    Department.add_department."""
+    await refresh_shard_map()
+    shard = hash_department_for_write(dept_dict['DepartmentID'])
+    async with get_async_registry().get_session(shard) as session:
+        if await session.run_sync(Department.add_department, dept_dict) is None:
+            return False
+    async with get_async_registry().get_session(shard_settings['directory_shard']) as session:
+        await session.run_sync(hospital_db.shard_map.pin, {dept_dict['DepartmentID']: shard})
+    return True
+
+
+async def modify_department(dept_id, new_values_dict):
+    """See Department.modify_department."""
+    await refresh_shard_map()
+    async with get_async_registry().get_session(hash_department_for_write(dept_id)) as session:
+        return await session.run_sync(Department.modify_department, dept_id, new_values_dict)
+
+
+async def delete_department(dept_id):
+    """Delete a department and remove it from the shard directory, see Department.delete_department."""
+    await refresh_shard_map()
+    async with get_async_registry().get_session(hash_department_for_write(dept_id)) as session:
+        if not await session.run_sync(Department.delete_department, dept_id):
+            return False
+    async with get_async_registry().get_session(shard_settings['directory_shard']) as session:
+        await session.run_sync(hospital_db.shard_map.unpin, dept_id)
+    return True
+
+
+async def get_department(filtering_dict=None):
+    """See Department.get_department, a single DepartmentID is read through the department cache."""
+    if cache_settings['enabled'] and filtering_dict and list(filtering_dict) == ['DepartmentID']:
+        await refresh_shard_map()
+        async with get_async_registry().get_session(hash_department(filtering_dict['DepartmentID'])) as session:
+            department = await session.run_sync(cached_instance, Department, filtering_dict['DepartmentID'])
+        departments = [department] if department is not None else []
+        return departments, len(departments)
+    return await _get_rows(Department, filtering_dict)
+
+
+# appointments
+async def add_appointment(appt_dict):
+    """See Appointment.add_appointment, returns True/False."""
+    return await _add_row(Appointment.add_appointment, appt_dict) is not None
+
+
+async def modify_appointment(filter_attributes_dict, new_values_dict):
+    """See Appointment.modify_appointment, returns the number of rows updated."""
+    return await _write_shards(Appointment._modify_appointments_in_shard, filter_attributes_dict, new_values_dict)
+
+
+async def delete_appointment(filter_attributes_dict):
+    """See Appointment.delete_appointment, returns the number of rows deleted."""
+    return await _write_shards(lambda session, filters: delete_matching_rows(session, Appointment, filters),
+                               filter_attributes_dict)
+
+
+async def get_appointment(filtering_dict=None):
+    """See Appointment.get_appointment."""
+    return await _get_rows(Appointment, filtering_dict)
+
+
+# receptionists and practitioners
+async def _modify_staff(model, filter_attributes_dict, new_values_dict):
+    """Update receptionists or practitioners in all databases concurrently, rows whose new DepartmentID belongs
+    to another database are moved there after the commit, like Reception.modify_receptionist. Returns the number of
+    rows updated or moved."""
+    await refresh_shard_map()
+    if 'DepartmentID' in filter_attributes_dict:
+        hash_department_for_write(filter_attributes_dict['DepartmentID'])
+    new_shard = hash_department_for_write(new_values_dict['DepartmentID']) \
+        if 'DepartmentID' in new_values_dict else None
+    async with shard_sessions(twophase=True) as sessions:
+        shards = route_shards(filter_attributes_dict, len(sessions))
+        try:
+            results = await gather_shards([sessions[shard].run_sync(
+                modify_staff_in_shard, model, shard, new_shard, filter_attributes_dict, new_values_dict)
+                for shard in shards], shards)
+            if not any(count for count, rows in results):
+                return 0
+            await commit_shards(sessions, shards)
+        except Exception:
+            await asyncio.gather(*(sessions[shard].rollback() for shard in shards), return_exceptions=True)
+            raise
+    # moves are rare and go through the synchronous engines, so they run in a worker thread
+    for shard, (count, rows) in zip(shards, results):
+        if rows:
+            await asyncio.to_thread(move_rows, model, shard, new_shard, rows, new_values_dict)
+    return sum(count for count, rows in results)
+
+
+async def add_receptionist(employee_dict):
+    """See Reception.add_receptionist, returns True/False."""
+    return await _add_row(Reception.add_receptionist, employee_dict) is not None
+
+
+async def modify_receptionist(filter_attributes_dict, new_values_dict):
+    """See Reception.modify_receptionist, returns the number of rows updated."""
+    return await _modify_staff(Reception, filter_attributes_dict, new_values_dict)
+
+
+async def delete_receptionist(filter_attributes_dict):
+    """See Reception.delete_receptionist, returns the number of rows deleted."""
+    return await _write_shards(lambda session, filters: delete_matching_rows(session, Reception, filters),
+                               filter_attributes_dict)
+
+
+async def get_receptionist(filtering_dict=None):
+    """See Reception.get_receptionist."""
+    return await _get_rows(Reception, filtering_dict)
+
+
+async def add_practitioner(employee_dict):
+    """See Practitioner.add_practitioner, returns True/False."""
+    return await _add_row(Practitioner.add_practitioner, employee_dict) is not None
+
+
+async def modify_practitioner(filter_attributes_dict, new_values_dict):
+    """See Practitioner.modify_practitioner, returns the number of rows updated."""
+    return await _modify_staff(Practitioner, filter_attributes_dict, new_values_dict)
+
+
+async def delete_practitioner(filter_attributes_dict):
+    """See Practitioner.delete_practitioner, returns the number of rows deleted."""
+    return await _write_shards(lambda session, filters: delete_matching_rows(session, Practitioner, filters),
+                               filter_attributes_dict)
+
+
+async def get_practitioner(filtering_dict=None):
+    """See Practitioner.get_practitioner."""
+    return await _get_rows(Practitioner, filtering_dict)
+
+
+# patients
+async def add_patient(patient_dict):
+    """See Patient.add_patient, returns True/False."""
+    return await _add_row(Patient.add_patient, patient_dict) is not None
+
+
+async def modify_patient(filter_attributes_dict, new_values_dict):
+    """See Patient.modify_patient, returns the number of rows updated."""
+    return await _write_shards(Patient._modify_patients_in_shard, filter_attributes_dict, new_values_dict)
+
+
+async def delete_patient(filter_attributes_dict):
+    """See Patient.delete_patient, returns the number of rows deleted."""
+    return await _write_shards(lambda session, filters: delete_matching_rows(session, Patient, filters),
+                               filter_attributes_dict)
+
+
+async def get_patient(filtering_dict=None):
+    """See Patient.get_patient."""
+    return await _get_rows(Patient, filtering_dict)
+
+
+# patient/practitioner pairs
+async def _collect_related(model, key_column, key_value, related_column, attribute_names, name_query,
+                           allow_partial=False):
+    """Run PatientOf._collect_related on every database concurrently, with allow_partial the databases that fail
+    are reported and skipped like in the synchronous version. Returns the pairs of all databases, their count and
+    the first name found."""
+    async with shard_sessions() as sessions:
+        results = await gather_shards([session.run_sync(
+            PatientOf._collect_related, model, key_column, key_value, related_column, attribute_names, name_query)
+            for session in sessions], range(len(sessions)), allow_partial)
+    results = [result for result in results if result is not None]
+    pairs = [pair for shard_pairs, name in results for pair in shard_pairs]
+    return pairs, len(pairs), next((name for shard_pairs, name in results if name), None)
+
+
+async def get_patients_of(practitioner_id, attribute_names=None, allow_partial=False):
+    """See PatientOf.get_patients_of."""
+    name_query = select(Practitioner.FirstName, Practitioner.LastName)\
+        .where(Practitioner.EmployeeID == practitioner_id)
+    return await _collect_related(Patient, PatientOf.PractitionerID, practitioner_id, PatientOf.PatientID,
+                                  attribute_names, name_query, allow_partial)
+
+
+async def get_practitioners_for(patient_id, attribute_names=None, allow_partial=False):
+    """See PatientOf.get_practitioners_for."""
+    name_query = select(Patient.FirstName, Patient.LastName).where(Patient.PatientID == patient_id).limit(1)
+    return await _collect_related(Practitioner, PatientOf.PatientID, patient_id, PatientOf.PractitionerID,
+                                  attribute_names, name_query, allow_partial)
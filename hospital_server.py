@@ -0,0 +1,142 @@
+import contextlib
+import io
+import json
+import sys
+import threading
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+from sqlalchemy.orm import configure_mappers
+
+import hospital_db
+
+# default address the server listens on and the client connects to
+server_host = '127.0.0.1'
+server_port = 8765
+
+
+def handle_rpc(request):
+    """
+    Function to run one JSON-RPC request against the warm shard engines.
+    :param request: dict in the JSON-RPC 2.0 format where the method is the operation name, e.g. "get_patient", and
+    params is the list of command line arguments that follow the operation, e.g. ["{\"LastName\": \"Brown\"}"].
+    A batch (a list of such dicts) is run one request after the other.
+    :return: the JSON-RPC response dict with the success flag and everything the operation printed as the result,
+    a list of them for a batch
+    """
+    if isinstance(request, list) and request:
+        return [handle_rpc(item) for item in request]
+    if not isinstance(request, dict):
+        return {'jsonrpc': '2.0', 'id': None,
+                'error': {'code': -32600, 'message': "Invalid request, expected a request object or a batch."}}
+    request_id = request.get('id')
+    operation = request.get('method')
+    params = request.get('params') or []
+    if not isinstance(operation, str) or not isinstance(params, list):
+        return {'jsonrpc': '2.0', 'id': request_id,
+                'error': {'code': -32600, 'message': "Invalid request, method must be a string and params a list."}}
+
+    # json objects may be sent either as strings in the command line format or as json values
+    argv = ['hospital_db.py', operation] + [param if isinstance(param, str) else json.dumps(param)
+                                            for param in params]
+    output = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(output):
+            success = hospital_db.run_operation(argv)
+    except Exception as e:
+        return {'jsonrpc': '2.0', 'id': request_id,
+                'error': {'code': -32000, 'message': str(e), 'data': output.getvalue()}}
+    return {'jsonrpc': '2.0', 'id': request_id, 'result': {'success': success, 'output': output.getvalue()}}
+
+
+class OperationRequestHandler(BaseHTTPRequestHandler):
+    """Accepts JSON-RPC requests posted to /rpc and runs them with hospital_db.run_operation, and serves the
+    statement metrics of the operations in the Prometheus text format on /metrics."""
+
+    def do_GET(self):
+        if self.path != '/metrics':
+            self.send_error(404, "Unknown path, metrics are served on /metrics")
+            return
+        body = hospital_db.metrics_text().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if self.path != '/rpc':
+            self.send_error(404, "Unknown path, post JSON-RPC requests to /rpc")
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length))
+        except Exception as e:
+            response = {'jsonrpc': '2.0', 'id': None, 'error': {'code': -32700, 'message': f"Parse error: {e}"}}
+        else:
+            response = handle_rpc(request)
+        self._send_json(response)
+
+    def _send_json(self, response):
+        body = json.dumps(response, default=str).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # keep the server output to one line per request
+        sys.stderr.write(f"{self.address_string()} {format % args}\n")
+
+
+def warm_up():
+    """Configure the mappers and open one pooled connection per shard so the first request doesn't pay for it,
+    then finish the two-phase commits and moves between databases that an earlier process left unfinished."""
+    configure_mappers()
+    shard_registry = hospital_db.get_registry()
+    for shard in sorted(shard_registry.urls):
+        with shard_registry.get_engine(shard).connect():
+            pass
+    try:
+        hospital_db.recover_twophase()
+        hospital_db.recover_migrations()
+    except Exception as e:
+        sys.stderr.write(f"Recovering the interrupted transactions failed, run init_schema first: {e}\n")
+
+
+def reconcile_forever(stop_event):
+    """Apply the derived column updates queued in deferred mode every reconcile_interval seconds."""
+    while not stop_event.wait(hospital_db.derived_settings['reconcile_interval']):
+        try:
+            hospital_db.reconcile_derived_columns()
+        except Exception as e:
+            sys.stderr.write(f"Reconciling the derived columns failed: {e}\n")
+
+
+def serve(host=server_host, port=server_port):
+    """Start the server and handle requests one at a time until interrupted."""
+    warm_up()
+    stop_event = threading.Event()
+    if hospital_db.derived_settings['mode'] == 'deferred':
+        threading.Thread(target=reconcile_forever, args=(stop_event,), name='reconciler', daemon=True).start()
+    httpd = HTTPServer((host, port), OperationRequestHandler)
+    print(f"Hospital database server listening on http://{host}:{port}/rpc")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_event.set()
+        httpd.server_close()
+        hospital_db.reset_registry()
+
+
+def main():
+    # optional arguments: host and port, e.g. python hospital_server.py 127.0.0.1 8765
+    host = sys.argv[1] if len(sys.argv) > 1 else server_host
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else server_port
+    serve(host, port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import contextlib
+import datetime
+import io
+import json
+import os
+import sys
+import threading
+from http.server import HTTPServer
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.dialects.sqlite import base as sqlite_base
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hospital_client  # noqa: E402
+import hospital_db  # noqa: E402
+import hospital_server  # noqa: E402
+
+
+def accept_iso_strings(type_class, parse):
+    """Let a SQLite date/time type bind ISO strings, the way MySQL accepts the strings passed on the command line."""
+    original = type_class.bind_processor
+
+    def bind_processor(self, dialect):
+        process = original(self, dialect)
+        return lambda value: process(parse(value) if isinstance(value, str) else value)
+    type_class.bind_processor = bind_processor
+
+
+# the tests run against two SQLite files standing in for the two MySQL databases
+accept_iso_strings(sqlite_base.DATE, datetime.date.fromisoformat)
+accept_iso_strings(sqlite_base.TIME, datetime.time.fromisoformat)
+
+
+def run_cli(*args):
+    """Run one command line operation, dicts and lists are passed as JSON.
+
+    :return: (success, printed output)
+    """
+    argv = ['hospital_db.py'] + [arg if isinstance(arg, str) else json.dumps(arg) for arg in args]
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        success = hospital_db.run_operation(argv)
+    return success, output.getvalue()
+
+
+def get_rows(*args):
+    """Run a get operation with --format jsonl and return the rows as dicts."""
+    success, output = run_cli(*args, '--format', 'jsonl')
+    assert success, output
+    return [json.loads(line) for line in output.splitlines() if line.startswith('{')]
+
+
+def shard_rows(shard, sql):
+    """Return the rows of a raw SQL query on one shard."""
+    with hospital_db.get_registry().get_engine(shard).connect() as connection:
+        return [tuple(row) for row in connection.exec_driver_sql(sql)]
+
+
+@contextlib.contextmanager
+def count_statements(shard_registry):
+    """Count the statements sent to each database while the block runs."""
+    counts = {shard: 0 for shard in shard_registry.urls}
+    listeners = {}
+    for shard in shard_registry.urls:
+        def count(*args, shard=shard):
+            counts[shard] += 1
+        listeners[shard] = count
+        event.listen(shard_registry.get_engine(shard), 'before_cursor_execute', count)
+    try:
+        yield counts
+    finally:
+        for shard, count in listeners.items():
+            event.remove(shard_registry.get_engine(shard), 'before_cursor_execute', count)
+
+
+@pytest.fixture
+def shards(tmp_path, monkeypatch):
+    """Two empty SQLite databases with the schema created, the logs are written under tmp_path."""
+    monkeypatch.setattr(hospital_db, 'engine_urls', {0: f"sqlite:///{tmp_path / 'database1.sqlite'}",
+                                                     1: f"sqlite:///{tmp_path / 'database2.sqlite'}"})
+    monkeypatch.setitem(hospital_db.twophase_settings, 'log_dir', str(tmp_path / 'twophase_log'))
+    monkeypatch.setitem(hospital_db.slow_query_settings, 'path', str(tmp_path / 'slow_queries.jsonl'))
+    hospital_db.reset_registry()
+    hospital_db.lookup_cache.clear()
+    success, output = run_cli('init_schema')
+    assert success, output
+    yield hospital_db.get_registry()
+    hospital_db.wait_for_straggling_tasks()
+    hospital_db.reset_registry()
+    hospital_db.lookup_cache.clear()
+
+
+@pytest.fixture
+def hospital(shards):
+    """Two departments, one on each database, with staff, a patient in each and an appointment in each."""
+    for row in ({'DepartmentID': 1, 'DepartmentName': 'Cardiology', 'TotalRooms': 100},
+                {'DepartmentID': 2, 'DepartmentName': 'Neurology', 'TotalRooms': 50}):
+        assert run_cli('add_department', row)[0]
+    assert run_cli('add_receptionist', {'EmployeeID': 211111, 'LastName': 'Smith', 'FirstName': 'John',
+                                        'DepartmentID': 1})[0]
+    assert run_cli('add_receptionist', {'EmployeeID': 211112, 'LastName': 'Patel', 'FirstName': 'Ria',
+                                        'DepartmentID': 2})[0]
+    assert run_cli('add_practitioner', {'EmployeeID': 111111, 'LastName': 'Jones', 'FirstName': 'Amanda',
+                                        'LicenseNumber': 4567, 'Title': 'Doctor', 'DepartmentID': 1,
+                                        'Specialty': 'Heart'})[0]
+    assert run_cli('add_practitioner', {'EmployeeID': 111112, 'LastName': 'Kim', 'FirstName': 'Lee',
+                                        'LicenseNumber': 4568, 'Title': 'Doctor', 'DepartmentID': 2,
+                                        'Specialty': 'Brain'})[0]
+    for dept_id in (1, 2):
+        assert run_cli('add_patient', {'PatientID': 1000, 'LastName': 'Brown', 'FirstName': 'Ollie',
+                                       'DOB': '1991-10-10', 'Gender': 'Female', 'Insurance': 'Aetna',
+                                       'PastProcedures': 'MR Scan', 'Notes': 'Lung', 'DepartmentID': dept_id})[0]
+    assert run_cli('add_appointment', {'ReceptionistID': 211111, 'PatientID': 1000, 'PractitionerID': 111111,
+                                       'DepartmentID': 1, 'AppointmentDate': '2024-03-19',
+                                       'AppointmentTime': '10:00', 'Notes': 'Follow-up'})[0]
+    assert run_cli('add_appointment', {'ReceptionistID': 211112, 'PatientID': 1000, 'PractitionerID': 111112,
+                                       'DepartmentID': 2, 'AppointmentDate': '2024-03-19',
+                                       'AppointmentTime': '11:00', 'Notes': 'Check-up'})[0]
+    return shards
+
+
+@pytest.fixture
+def server(hospital, monkeypatch):
+    """A server on a free local port, handling requests in a background thread."""
+    hospital_server.warm_up()
+    httpd = HTTPServer(('127.0.0.1', 0), hospital_server.OperationRequestHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(hospital_client, 'server_url', f"http://127.0.0.1:{httpd.server_port}/rpc")
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
@@ -0,0 +1,163 @@
+import asyncio
+import datetime
+
+import pytest
+
+pytest.importorskip('aiosqlite')
+
+import hospital_db  # noqa: E402
+import hospital_db_async  # noqa: E402
+
+from conftest import shard_rows  # noqa: E402
+
+
+def run_async(test):
+    """Run an async test function with a fresh async registry, disposed of on the same event loop."""
+    async def run():
+        try:
+            return await test()
+        finally:
+            await hospital_db_async.reset_async_registry()
+    return asyncio.run(run())
+
+
+def practitioner(employee_id, dept_id):
+    return {'EmployeeID': employee_id, 'LastName': f'P{employee_id}', 'FirstName': 'A', 'LicenseNumber': employee_id,
+            'Title': 'Doctor', 'DepartmentID': dept_id, 'Specialty': ''}
+
+
+def patient(dept_id):
+    return {'PatientID': 1000, 'LastName': 'Brown', 'FirstName': 'Ollie', 'DOB': datetime.date(1991, 10, 10),
+            'Gender': 'Female', 'Insurance': 'Aetna', 'PastProcedures': '', 'Notes': '', 'DepartmentID': dept_id}
+
+
+async def add_hospital():
+    for dept_id, name in ((1, 'Cardiology'), (2, 'Neurology')):
+        assert await hospital_db_async.add_department({'DepartmentID': dept_id, 'DepartmentName': name,
+                                                       'TotalRooms': 10})
+    assert await hospital_db_async.add_receptionist({'EmployeeID': 211111, 'LastName': 'Smith', 'FirstName': 'John',
+                                                     'DepartmentID': 1})
+    assert all(await asyncio.gather(*(hospital_db_async.add_practitioner(practitioner(111110 + n, 1 + n % 2))
+                                      for n in range(6))))
+    assert all(await asyncio.gather(*(hospital_db_async.add_patient(patient(dept_id)) for dept_id in (1, 2))))
+    assert await hospital_db_async.add_appointment({
+        'ReceptionistID': 211111, 'PatientID': 1000, 'PractitionerID': 111110, 'DepartmentID': 1,
+        'AppointmentDate': datetime.date(2024, 3, 18), 'AppointmentTime': datetime.time(8, 0), 'Notes': ''})
+
+
+def test_add_and_get(shards):
+    async def test():
+        await add_hospital()
+        departments, count = await hospital_db_async.get_department()
+        assert count == 2
+        assert sorted((department.DepartmentID, department.TotalPractitioners, department.TotalReceptionists)
+                      for department in departments) == [(1, 3, 1), (2, 3, 0)]
+        departments, count = await hospital_db_async.get_department({'DepartmentID': 1})
+        assert [department.DepartmentName for department in departments] == ['Cardiology']
+        assert isinstance(departments[0], hospital_db.Department)
+        appointments, count = await hospital_db_async.get_appointment()
+        assert [appointment.patient_a.FirstName for appointment in appointments] == ['Ollie']
+        assert await hospital_db_async.department_name(appointments[0].DepartmentID) == 'Cardiology'
+        patients, count = await hospital_db_async.get_patient({'DepartmentID': 2})
+        assert [(row.PatientID, row.SchedulingState) for row in patients] == [(1000, 'Unscheduled')]
+    run_async(test)
+    assert sorted(shard_rows(0, 'SELECT DepartmentID, ShardID FROM Shard_Directory')) == [(1, 1), (2, 0)]
+
+
+def test_patient_of_lookups(shards):
+    async def test():
+        await add_hospital()
+        patients_of = await hospital_db_async.get_patients_of(111110)
+        assert [patient_id for patient_id, rows in patients_of[0]] == [1000]
+        practitioners_for = await hospital_db_async.get_practitioners_for(1000, ['FirstName', 'LastName'])
+        assert [rows[0].LastName for employee_id, rows in practitioners_for[0]] == ['P111110']
+    run_async(test)
+
+
+def test_modify(shards):
+    async def test():
+        await add_hospital()
+        assert await hospital_db_async.modify_patient({'PatientID': 1000}, {'Insurance': 'Kaiser'}) == 2
+        assert {row.Insurance for row in (await hospital_db_async.get_patient())[0]} == {'Kaiser'}
+        assert await hospital_db_async.modify_appointment({'PatientID': 1000}, {'Notes': 'Moved'}) == 1
+        assert await hospital_db_async.modify_department(2, {'DepartmentName': 'Neuro'})
+        # a receptionist moving to a department in the other database is moved there, once it has no appointments
+        with pytest.raises(Exception, match='still have appointments'):
+            await hospital_db_async.modify_receptionist({'EmployeeID': 211111}, {'DepartmentID': 2})
+        assert await hospital_db_async.delete_appointment({'ReceptionistID': 211111}) == 1
+        assert await hospital_db_async.modify_receptionist({'EmployeeID': 211111}, {'DepartmentID': 2}) == 1
+        receptionists, count = await hospital_db_async.get_receptionist()
+        assert [(row.EmployeeID, row.DepartmentID) for row in receptionists] == [(211111, 2)]
+    run_async(test)
+    assert shard_rows(0, 'SELECT EmployeeID FROM Receptionists') == [(211111,)]
+    assert shard_rows(1, 'SELECT COUNT(*) FROM Receptionists') == [(0,)]
+
+
+def test_delete(shards):
+    async def test():
+        await add_hospital()
+        assert await hospital_db_async.delete_appointment({'PatientID': 1000}) == 1
+        assert await hospital_db_async.delete_practitioner({'LastName': 'P111115'}) == 1
+        assert await hospital_db_async.delete_receptionist({'EmployeeID': 211111}) == 1
+        departments, count = await hospital_db_async.get_department()
+        assert sorted((department.DepartmentID, department.TotalPractitioners, department.TotalReceptionists)
+                      for department in departments) == [(1, 3, 0), (2, 2, 0)]
+        assert await hospital_db_async.delete_patient({'PatientID': 1000}) == 2
+        assert await hospital_db_async.delete_department(1)
+        assert (await hospital_db_async.get_department())[1] == 1
+    run_async(test)
+    assert shard_rows(0, 'SELECT DepartmentID FROM Shard_Directory') == [(2,)]
+
+
+def test_concurrent_operations_share_the_engines(shards):
+    async def test():
+        await add_hospital()
+        results = await asyncio.gather(
+            hospital_db_async.get_practitioner({'DepartmentID': 1}),
+            hospital_db_async.get_practitioner({'DepartmentID': 2}),
+            hospital_db_async.get_patient(),
+            *(hospital_db_async.modify_practitioner({'EmployeeID': 111110 + n}, {'Title': 'Surgeon'})
+              for n in range(6)))
+        assert [count for rows, count in results[:3]] == [3, 3, 2]
+        assert results[3:] == [1] * 6
+        practitioners, count = await hospital_db_async.get_practitioner()
+        assert {row.Title for row in practitioners} == {'Surgeon'}
+        registry = hospital_db_async.get_async_registry()
+        assert registry.get_engine(0) is registry.get_engine(0)
+    run_async(test)
+
+
+def test_failed_database_is_reported_unless_partial_rows_are_allowed(shards, monkeypatch, capsys):
+    collect_related = hospital_db.PatientOf._collect_related
+
+    def fail_on_the_second_database(session, *args):
+        if session.get_bind().url.database.endswith('database2.sqlite'):
+            raise RuntimeError("connection lost")
+        return collect_related(session, *args)
+
+    async def test():
+        await add_hospital()
+        monkeypatch.setattr(hospital_db.PatientOf, '_collect_related', fail_on_the_second_database)
+        with pytest.raises(RuntimeError):
+            await hospital_db_async.get_practitioners_for(1000)
+        practitioners_for = await hospital_db_async.get_practitioners_for(1000, allow_partial=True)
+        assert practitioners_for[1] == 0  # the pair is stored in the database of department 1
+    run_async(test)
+    assert 'database 2 could not be queried' in capsys.readouterr().err
+
+
+def test_writes_to_a_moving_department_are_refused(shards, monkeypatch):
+    monkeypatch.setitem(hospital_db.shard_settings, 'directory_ttl', 60)
+
+    async def test():
+        await add_hospital()
+        hospital_db.rebalance_department(1, 0)
+        for write in (hospital_db_async.modify_appointment({'DepartmentID': 1}, {'Notes': 'Moved'}),
+                      hospital_db_async.modify_department(1, {'DepartmentName': 'Cardio'}),
+                      hospital_db_async.add_receptionist({'EmployeeID': 211112, 'LastName': 'Doe',
+                                                          'FirstName': 'Jane', 'DepartmentID': 1}),
+                      hospital_db_async.modify_receptionist({'EmployeeID': 211111}, {'DepartmentID': 1})):
+            with pytest.raises(Exception, match='is being moved'):
+                await write
+        assert await hospital_db_async.modify_department(2, {'DepartmentName': 'Neuro'})
+    run_async(test)
@@ -0,0 +1,97 @@
+import json
+
+import pytest
+
+import hospital_db
+
+from conftest import get_rows, run_cli, shard_rows
+
+
+def write_batch(path, operations):
+    path.write_text(''.join(json.dumps({'op': op, 'args': list(args)}) + '\n' for op, *args in operations))
+    return str(path)
+
+
+@pytest.fixture
+def batch(hospital):
+    batch = hospital_db.BatchSessions(hospital)
+    yield batch
+    batch.close()
+
+
+def test_operations_are_committed_together(hospital, tmp_path):
+    path = write_batch(tmp_path / 'ops.jsonl', [
+        ('modify_patient', {'PatientID': 1000}, {'Insurance': 'Kaiser'}),
+        ('delete_appointment', {'DepartmentID': 2})])
+    success, output = run_cli('batch', path)
+    assert success, output
+    assert 'Batch finished: 2 of 2 operations succeeded' in output
+    assert [row['Insurance'] for row in get_rows('get_patient')] == ['Kaiser', 'Kaiser']
+
+
+def test_failed_operation_is_undone_on_its_own(hospital, tmp_path):
+    path = write_batch(tmp_path / 'ops.jsonl', [
+        ('modify_patient', {'PatientID': 1000}, {'Insurance': 'Kaiser'}),
+        ('add_department', {'DepartmentID': 1, 'DepartmentName': 'Duplicate', 'TotalRooms': 1}),
+        ('delete_appointment', {'DepartmentID': 2})])
+    success, output = run_cli('batch', path, '--on-error', 'continue')
+    assert not success
+    assert 'Line 2 (add_department)' in output
+    assert [row['Insurance'] for row in get_rows('get_patient')] == ['Kaiser', 'Kaiser']
+    assert [row['DepartmentName'] for row in get_rows('get_department', {'DepartmentID': 1})] == ['Cardiology']
+
+
+def test_directory_pins_and_moves_wait_for_the_grouped_commit(hospital, tmp_path):
+    path = write_batch(tmp_path / 'ops.jsonl', [
+        ('add_department', {'DepartmentID': 4, 'DepartmentName': 'Oncology', 'TotalRooms': 5}),
+        ('add_receptionist', {'EmployeeID': 211113, 'LastName': 'Lee', 'FirstName': 'Sam', 'DepartmentID': 4}),
+        ('delete_appointment', {'ReceptionistID': 211111}),
+        ('modify_receptionist', {'EmployeeID': 211111}, {'DepartmentID': 4}),
+        ('delete_department', '2')])
+    success, output = run_cli('batch', path)
+    assert success, output
+    assert sorted(shard_rows(0, 'SELECT DepartmentID, ShardID FROM Shard_Directory')) == [(1, 1), (4, 0)]
+    assert shard_rows(1, 'SELECT COUNT(*) FROM Receptionists') == [(0,)]
+    assert sorted(shard_rows(0, 'SELECT EmployeeID FROM Receptionists WHERE DepartmentID = 4')) == [(211111,),
+                                                                                                 (211113,)]
+    assert get_rows('get_department', {'DepartmentID': 4})[0]['TotalReceptionists'] == 2
+
+
+def test_steps_of_a_failed_operation_are_dropped(batch):
+    called = []
+    batch.begin_operation()
+    hospital_db.run_after_commit(batch.get_session(0), lambda: called.append('failed'))
+    batch.end_operation(False)
+    batch.begin_operation()
+    hospital_db.run_after_commit(batch.get_session(1), lambda: called.append('succeeded'))
+    batch.end_operation(True)
+    assert called == []
+    batch.commit()
+    assert called == ['succeeded']
+
+
+def test_steps_are_dropped_when_the_group_rolls_back(batch):
+    called = []
+    batch.begin_operation()
+    hospital_db.run_after_commit(batch.get_session(0), lambda: called.append('step'))
+    batch.end_operation(True)
+    batch.rollback()
+    batch.commit()
+    assert called == []
+
+
+def test_steps_outside_a_batch_run_right_away(hospital):
+    called = []
+    session = hospital.get_session(0)
+    try:
+        hospital_db.run_after_commit(session, lambda: called.append('step'))
+    finally:
+        session.close()
+    assert called == ['step']
+
+
+def test_maintenance_operations_are_rejected_in_a_batch(hospital, tmp_path):
+    path = write_batch(tmp_path / 'ops.jsonl', [('rebalance_department', '1', '0')])
+    success, output = run_cli('batch', path)
+    assert not success
+    assert 'rebalance_department cannot run inside a batch' in output
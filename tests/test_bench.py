@@ -0,0 +1,61 @@
+import contextlib
+import io
+
+import pytest
+
+import hospital_bench
+import hospital_db
+
+from conftest import shard_rows
+
+
+@pytest.fixture
+def settings(shards, tmp_path):
+    """A tiny synthetic hospital, written to SQLite files under tmp_path."""
+    return dict(hospital_bench.bench_settings, shards=2, departments=2, practitioners=2, receptionists=1, patients=3,
+                appointments=20, days=5, data_dir=str(tmp_path / 'bench_data'))
+
+
+def test_generated_hospital_is_the_same_for_a_seed(settings):
+    hospital = hospital_bench.generate_hospital(settings)
+    assert hospital == hospital_bench.generate_hospital(settings)
+    assert {table_name: len(rows) for table_name, rows in hospital.items()} == {
+        'departments': 2, 'receptionists': 4, 'practitioners': 4, 'patients': 6, 'appointments': 20}
+    assert len({(row['PractitionerID'], row['AppointmentDate'], row['AppointmentTime'])
+                for row in hospital['appointments']}) == 20
+
+
+def test_too_many_patients_are_rejected(settings):
+    with pytest.raises(ValueError):
+        hospital_bench.generate_hospital(dict(settings, departments=10, patients=901))
+
+
+def test_load_and_run(settings):
+    hospital = hospital_bench.generate_hospital(settings)
+    hospital_bench.load_hospital(settings, hospital)
+    counts = [shard_rows(shard, 'SELECT COUNT(*) FROM Appointments')[0][0] for shard in (0, 1)]
+    assert sum(counts) == 20
+    state = hospital_bench.BenchState(settings, hospital)
+    operations = {name: hospital_bench.bench_operations[name]
+                  for name in ('get_department', 'get_daily_schedule', 'add_appointment',
+                               'modify_receptionist_cross_shard', 'delete_appointment')}
+    results = hospital_bench.run_benchmark(state, 3, operations)
+    assert list(results) == list(operations)
+    for result in results.values():
+        assert result['runs'] == 3
+        assert result['p50_ms'] <= result['p99_ms']
+        assert result['statements_per_op'] > 0
+    # the deletes undo the adds, including the one run under tracemalloc
+    assert hospital_db.current_profile.get() is None
+    assert sum(shard_rows(shard, 'SELECT COUNT(*) FROM Appointments')[0][0] for shard in (0, 1)) == 20
+
+
+def test_compare_results():
+    previous = {'commit': 'abc123', 'operations': {'get_department': {'p50_ms': 2.0, 'statements_per_op': 3}}}
+    current = {'operations': {'get_department': {'p50_ms': 1.0, 'statements_per_op': 1},
+                              'add_appointment': {'p50_ms': 5.0, 'statements_per_op': 4}}}
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        hospital_bench.compare_results(previous, current)
+    assert output.getvalue().splitlines() == ['Compared with commit abc123:',
+                                              'get_department: p50 2.0 -> 1.0 ms (0.50x), statements 3 -> 1']
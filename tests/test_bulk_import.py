@@ -0,0 +1,50 @@
+import json
+
+import hospital_db
+
+from conftest import get_rows, run_cli, shard_rows
+
+
+def write_jsonl(path, rows):
+    path.write_text(''.join(json.dumps(row) + '\n' for row in rows))
+    return str(path)
+
+
+def test_import_csv_departments_and_jsonl_staff(shards, tmp_path):
+    departments = tmp_path / 'departments.csv'
+    departments.write_text('DepartmentID,DepartmentName,TotalRooms\n1,Cardiology,10\n2,Neurology,20\n')
+    assert hospital_db.bulk_import('departments', str(departments)) == (2, [])
+    practitioners = write_jsonl(tmp_path / 'practitioners.jsonl', [
+        {'EmployeeID': 100000 + n, 'LastName': f'Doctor{n}', 'FirstName': 'A', 'LicenseNumber': n,
+         'Title': 'Doctor', 'DepartmentID': 1 + n % 2, 'Specialty': ''} for n in range(5)])
+    assert hospital_db.bulk_import('practitioners', practitioners, batch_size=2) == (5, [])
+
+    assert shard_rows(1, 'SELECT COUNT(*) FROM Practitioners') == [(3,)]
+    assert shard_rows(0, 'SELECT COUNT(*) FROM Practitioners') == [(2,)]
+    # the derived counts are maintained per batch
+    totals = {row['DepartmentID']: row['TotalPractitioners'] for row in get_rows('get_department')}
+    assert totals == {1: 3, 2: 2}
+    assert sorted(shard_rows(0, 'SELECT DepartmentID, ShardID FROM Shard_Directory')) == [(1, 1), (2, 0)]
+
+
+def test_bad_rows_are_reported_by_line_and_the_rest_imported(hospital, tmp_path):
+    path = tmp_path / 'patients.jsonl'
+    path.write_text('{"PatientID": 1001, "LastName": "A", "FirstName": "B", "DOB": "2000-01-01", "Gender": "Male",'
+                    ' "DepartmentID": 1}\n'
+                    'not json\n'
+                    '{"PatientID": 1002, "LastName": "C", "FirstName": "D", "DOB": "2000-01-01", "Gender": "Male",'
+                    ' "DepartmentID": 2}\n'
+                    '{"PatientID": 1003, "LastName": "E", "DOB": "2000-01-01", "Gender": "Male", "DepartmentID": 2}\n')
+    success, output = run_cli('bulk_import', 'patients', str(path))
+    assert not success
+    assert 'Line 2:' in output and 'Line 4:' in output
+    assert 'Imported 2 rows into patients, 2 rows failed.' in output
+    assert sorted(row['PatientID'] for row in get_rows('get_patient')) == [1000, 1000, 1001, 1002]
+
+
+def test_imported_appointments_fill_patient_of(hospital, tmp_path):
+    path = write_jsonl(tmp_path / 'appointments.jsonl', [
+        {'ReceptionistID': 211111, 'PatientID': 1000, 'PractitionerID': 111111, 'DepartmentID': 1,
+         'AppointmentDate': '2024-03-20', 'AppointmentTime': f"{hour:02}:00", 'Notes': ''} for hour in (9, 10)])
+    assert hospital_db.bulk_import('appointments', path) == (2, [])
+    assert shard_rows(1, 'SELECT AppointmentCount FROM Patient_Of WHERE PractitionerID = 111111') == [(3,)]
@@ -0,0 +1,89 @@
+import pytest
+
+import hospital_db
+
+from conftest import count_statements, run_cli
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = hospital_db.LookupCache()
+    monkeypatch.setitem(hospital_db.cache_settings, 'max_entries', 3)
+    return cache
+
+
+def test_invalidate_one_key_leaves_the_others(cache):
+    cache.put(('Practitioners', 1), 'a')
+    cache.put(('Practitioners', 2), 'b')
+    cache.put(('Departments', 1), 'c')
+    cache.invalidate('Practitioners', 1)
+    assert cache.get(('Practitioners', 1)) is None
+    assert cache.get(('Practitioners', 2)) == 'b'
+    assert cache.get(('Departments', 1)) == 'c'
+    assert cache.stats()['invalidations'] == 1
+
+
+def test_invalidate_a_table(cache):
+    cache.put(('Practitioners', 1), 'a')
+    cache.put(('Practitioners', 2), 'b')
+    cache.put(('Departments', 1), 'c')
+    cache.invalidate('Practitioners')
+    assert cache.stats()['entries'] == 1
+    assert cache.stats()['invalidations'] == 2
+    assert cache.get(('Departments', 1)) == 'c'
+
+
+def test_least_recently_used_entry_is_evicted(cache):
+    for key in (1, 2, 3):
+        cache.put(('Departments', key), key)
+    cache.get(('Departments', 1))
+    cache.put(('Departments', 4), 4)
+    assert cache.get(('Departments', 2)) is None
+    assert cache.stats()['evictions'] == 1
+    # an evicted key is not invalidated again
+    cache.invalidate('Departments')
+    assert cache.stats()['invalidations'] == 3
+
+
+def test_expired_entries_are_misses(cache, monkeypatch):
+    monkeypatch.setitem(hospital_db.cache_settings, 'ttl', -1)
+    cache.put(('Departments', 1), 'a')
+    assert cache.get(('Departments', 1)) is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_department_lookup_is_served_from_the_cache(hospital):
+    assert run_cli('get_department', {'DepartmentID': 1})[0]
+    with count_statements(hospital) as counts:
+        success, output = run_cli('get_department', {'DepartmentID': 1})
+    assert 'DepartmentName: Cardiology' in output
+    assert counts == {0: 0, 1: 0}
+
+
+def test_cached_department_is_a_department(hospital):
+    hits = hospital_db.lookup_cache.stats()['hits']
+    sessions = hospital.get_sessions()
+    try:
+        for _ in range(2):  # a miss, then a hit
+            departments, count = hospital_db.Department.get_department(sessions, {'DepartmentID': 1})
+            assert count == 1 and isinstance(departments[0], hospital_db.Department)
+            assert (departments[0].DepartmentName, departments[0].TotalPractitioners) == ('Cardiology', 1)
+            assert hospital_db.inspect(departments[0]).detached
+    finally:
+        for session in sessions:
+            session.close()
+    assert hospital_db.lookup_cache.stats()['hits'] == hits + 1
+
+
+def test_changes_are_seen_right_away(hospital):
+    assert run_cli('get_department', {'DepartmentID': 1})[0]
+    assert run_cli('modify_department', '1', {'DepartmentName': 'Emergency'})[0]
+    assert 'DepartmentName: Emergency' in run_cli('get_department', {'DepartmentID': 1})[1]
+
+
+def test_delete_drops_only_the_deleted_staff(hospital):
+    for table, key in (('Practitioners', 111111), ('Practitioners', 111112)):
+        hospital_db.lookup_cache.put((table, key), 'cached')
+    assert run_cli('delete_practitioner', {'LastName': 'Jones'})[0]
+    assert hospital_db.lookup_cache.get(('Practitioners', 111111)) is None
+    assert hospital_db.lookup_cache.get(('Practitioners', 111112)) == 'cached'
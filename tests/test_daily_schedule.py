@@ -0,0 +1,76 @@
+import datetime
+
+import hospital_db
+
+from conftest import run_cli, shard_rows
+
+
+def schedule(shard_registry, day='2024-03-19', dept_id=None):
+    """Return the daily schedule rows of a day as (DepartmentID, time, practitioner, patient, notes) tuples."""
+    sessions = shard_registry.get_sessions()
+    try:
+        rows, count = hospital_db.DailySchedule.get_daily_schedule(sessions, datetime.date.fromisoformat(day), dept_id)
+    finally:
+        for session in sessions:
+            session.close()
+    assert count == len(rows)
+    return [(row.DepartmentID, row.AppointmentTime.strftime('%H:%M'), row.PractitionerLastName, row.PatientLastName,
+             row.Notes) for row in rows]
+
+
+def test_schedule_of_every_department(hospital):
+    assert schedule(hospital) == [(1, '10:00', 'Jones', 'Brown', 'Follow-up'), (2, '11:00', 'Kim', 'Brown', 'Check-up')]
+    assert schedule(hospital, dept_id=2) == [(2, '11:00', 'Kim', 'Brown', 'Check-up')]
+    assert schedule(hospital, day='2024-03-20') == []
+
+
+def test_command_line(hospital):
+    success, output = run_cli('get_daily_schedule', {'AppointmentDate': '2024-03-19', 'DepartmentID': 1})
+    assert success
+    assert 'PractitionerLastName: Jones' in output
+    assert 'Neurology' not in output and 'PractitionerLastName: Kim' not in output
+    assert 'Total count of appointments on the schedule: 1' in output
+    success, output = run_cli('get_daily_schedule', {'DepartmentID': 1})
+    assert not success
+    assert 'please specify the AppointmentDate' in output
+
+
+def test_added_modified_and_deleted_appointments(hospital):
+    assert run_cli('add_appointment', {'ReceptionistID': 211111, 'PatientID': 1000, 'PractitionerID': 111111,
+                                       'DepartmentID': 1, 'AppointmentDate': '2024-03-19',
+                                       'AppointmentTime': '08:00', 'Notes': 'New'})[0]
+    assert schedule(hospital, dept_id=1) == [(1, '08:00', 'Jones', 'Brown', 'New'),
+                                             (1, '10:00', 'Jones', 'Brown', 'Follow-up')]
+    assert run_cli('modify_appointment', {'Notes': 'New'}, {'AppointmentDate': '2024-03-20'})[0]
+    assert schedule(hospital, dept_id=1) == [(1, '10:00', 'Jones', 'Brown', 'Follow-up')]
+    assert schedule(hospital, day='2024-03-20') == [(1, '08:00', 'Jones', 'Brown', 'New')]
+    assert run_cli('delete_appointment', {'AppointmentDate': '2024-03-20'})[0]
+    assert schedule(hospital, day='2024-03-20') == []
+
+
+def test_renamed_practitioner_and_patient(hospital):
+    assert run_cli('modify_practitioner', {'EmployeeID': 111111}, {'LastName': 'Jones-Smith'})[0]
+    assert run_cli('modify_patient', {'PatientID': 1000}, {'LastName': 'Green'})[0]
+    assert schedule(hospital) == [(1, '10:00', 'Jones-Smith', 'Green', 'Follow-up'),
+                                  (2, '11:00', 'Kim', 'Green', 'Check-up')]
+
+
+def test_deleted_department_drops_its_schedule(hospital):
+    assert run_cli('delete_department', '1')[0]
+    assert schedule(hospital) == [(2, '11:00', 'Kim', 'Brown', 'Check-up')]
+    assert shard_rows(1, 'SELECT COUNT(*) FROM Daily_Schedule') == [(0,)]
+
+
+def test_deferred_mode_keeps_the_schedule_current(hospital, monkeypatch):
+    monkeypatch.setitem(hospital_db.derived_settings, 'mode', 'deferred')
+    assert run_cli('modify_appointment', {'DepartmentID': 2}, {'AppointmentTime': '12:00'})[0]
+    assert schedule(hospital, dept_id=2) == [(2, '12:00', 'Kim', 'Brown', 'Check-up')]
+
+
+def test_init_schema_fills_an_empty_schedule(hospital):
+    for shard in (0, 1):
+        with hospital.get_engine(shard).begin() as connection:
+            connection.exec_driver_sql('DELETE FROM Daily_Schedule')
+    assert schedule(hospital) == []
+    assert run_cli('init_schema')[0]
+    assert schedule(hospital) == [(1, '10:00', 'Jones', 'Brown', 'Follow-up'), (2, '11:00', 'Kim', 'Brown', 'Check-up')]
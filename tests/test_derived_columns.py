@@ -0,0 +1,42 @@
+import hospital_db
+
+from conftest import get_rows, run_cli, shard_rows
+
+
+def department_totals():
+    return {row['DepartmentID']: (row['TotalPractitioners'], row['TotalReceptionists'])
+            for row in get_rows('get_department')}
+
+
+def scheduling_states():
+    return {row['DepartmentID']: row['SchedulingState'] for row in get_rows('get_patient')}
+
+
+def test_counts_follow_adds_and_deletes(hospital):
+    assert department_totals() == {1: (1, 1), 2: (1, 1)}
+    assert run_cli('add_practitioner', {'EmployeeID': 111113, 'LastName': 'Ng', 'FirstName': 'Bo',
+                                        'LicenseNumber': 4569, 'Title': 'Nurse', 'DepartmentID': 1,
+                                        'Specialty': 'Heart'})[0]
+    assert run_cli('delete_receptionist', {'EmployeeID': 211112})[0]
+    assert department_totals() == {1: (2, 1), 2: (1, 0)}
+
+
+def test_scheduling_state_follows_the_appointments(hospital):
+    assert scheduling_states() == {1: 'Scheduled', 2: 'Scheduled'}
+    assert run_cli('delete_appointment', {'DepartmentID': 2})[0]
+    assert scheduling_states() == {1: 'Scheduled', 2: 'Unscheduled'}
+
+
+def test_deferred_mode_queues_the_keys_until_reconciled(hospital, monkeypatch):
+    monkeypatch.setitem(hospital_db.derived_settings, 'mode', 'deferred')
+    assert run_cli('delete_practitioner', {'EmployeeID': 111112})[0]
+    assert run_cli('delete_appointment', {'DepartmentID': 1})[0]
+    assert department_totals()[2] == (1, 1)
+    assert scheduling_states()[1] == 'Scheduled'
+    assert shard_rows(0, 'SELECT COUNT(*) FROM Derived_Refresh_Queue') != [(0,)]
+
+    assert run_cli('reconcile_derived')[0]
+    assert department_totals()[2] == (0, 1)
+    assert scheduling_states()[1] == 'Unscheduled'
+    assert shard_rows(0, 'SELECT COUNT(*) FROM Derived_Refresh_Queue') == [(0,)]
+    assert shard_rows(1, 'SELECT COUNT(*) FROM Derived_Refresh_Queue') == [(0,)]
@@ -0,0 +1,48 @@
+import datetime
+
+import pytest
+
+import hospital_db
+
+from conftest import run_cli
+
+
+@pytest.fixture
+def sessions(hospital):
+    sessions = hospital.get_sessions()
+    yield sessions
+    for session in sessions:
+        session.close()
+
+
+def slot_times(slots):
+    return [(str(slot.AppointmentDate), slot.AppointmentTime.strftime('%H:%M')) for slot in slots]
+
+
+def test_booked_slots_are_skipped(sessions):
+    day = datetime.date(2024, 3, 19)
+    slots = hospital_db.Appointment.find_free_slots(sessions, day, day, 111111, None, 5)
+    assert slot_times(slots) == [('2024-03-19', '08:00'), ('2024-03-19', '08:30'), ('2024-03-19', '09:00'),
+                                 ('2024-03-19', '09:30'), ('2024-03-19', '10:30')]
+    assert {slot.PractitionerID for slot in slots} == {111111}
+
+
+def test_weekends_are_skipped(sessions):
+    slots = hospital_db.Appointment.find_free_slots(sessions, datetime.date(2024, 3, 23), datetime.date(2024, 3, 29),
+                                                    111111, None, 1)
+    assert slot_times(slots) == [('2024-03-25', '08:00')]
+
+
+def test_department_search_covers_its_practitioners(sessions):
+    day = datetime.date(2024, 3, 19)
+    slots = hospital_db.Appointment.find_free_slots(sessions, day, day, None, 2, 100)
+    assert {slot.PractitionerID for slot in slots} == {111112}
+    assert ('2024-03-19', '11:00') not in slot_times(slots)
+    assert len(slots) == 17  # 08:00 to 16:30 without the booked 11:00
+
+
+def test_command_line(hospital):
+    success, output = run_cli('find_free_slots', {'PractitionerID': 111112, 'StartDate': '2024-03-19',
+                                                  'EndDate': '2024-03-19', 'Count': 2})
+    assert success
+    assert 'Total count of free slots found: 2' in output
@@ -0,0 +1,33 @@
+from sqlalchemy import inspect
+
+import hospital_db
+
+from conftest import run_cli
+
+
+def test_indexes_are_created_on_every_database(shards):
+    for shard in (0, 1):
+        inspector = inspect(shards.get_engine(shard))
+        appointment_indexes = {index['name'] for index in inspector.get_indexes('Appointments')}
+        assert {'ix_Appointments_PatientID_DepartmentID', 'ix_Appointments_AppointmentDate'} <= appointment_indexes
+        assert 'ix_Patients_LastName' in {index['name'] for index in inspector.get_indexes('Patients')}
+
+
+def test_init_schema_adds_missing_indexes_to_existing_databases(shards):
+    with shards.get_engine(1).begin() as connection:
+        connection.exec_driver_sql('DROP INDEX ix_Patients_LastName')
+    assert run_cli('init_schema')[0]
+    assert 'ix_Patients_LastName' in {index['name'] for index in inspect(shards.get_engine(1)).get_indexes('Patients')}
+
+
+def test_advisor_finds_no_full_scans_for_the_built_in_queries(hospital):
+    findings = hospital_db.index_advisor()
+    assert findings
+    assert [description for db_num, description, plan, full_scan in findings if full_scan] == []
+
+
+def test_advisor_reports_a_full_scan_for_an_unindexed_filter(hospital):
+    success, output = run_cli('index_advisor', 'get_patient', {'FirstName': 'Ollie'})
+    assert success
+    assert 'FULL SCAN' in output
+    assert '2 full table scans were found.' in output
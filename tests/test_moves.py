@@ -0,0 +1,65 @@
+import pytest
+
+import hospital_db
+
+from conftest import get_rows, run_cli, shard_rows
+
+
+def test_practitioner_with_appointments_is_not_moved(hospital):
+    with pytest.raises(Exception, match='Practitioners 111111 still have appointments'):
+        run_cli('modify_practitioner', {'EmployeeID': 111111}, {'DepartmentID': 2})
+    assert shard_rows(1, 'SELECT EmployeeID, DepartmentID FROM Practitioners') == [(111111, 1)]
+    assert shard_rows(1, 'SELECT COUNT(*) FROM Appointments') == [(1,)]
+    assert shard_rows(1, 'SELECT COUNT(*) FROM Patient_Of') == [(1,)]
+
+
+def test_move_rows_refuses_staff_with_appointments(hospital):
+    rows = [{'EmployeeID': 211111, 'LastName': 'Smith', 'FirstName': 'John', 'DepartmentID': 1}]
+    with pytest.raises(Exception, match='still have appointments'):
+        hospital_db.move_rows(hospital_db.Reception, 1, 0, rows, {'DepartmentID': 2})
+    assert shard_rows(1, 'SELECT EmployeeID FROM Receptionists') == [(211111,)]
+    assert shard_rows(1, 'SELECT COUNT(*) FROM Migration_Intents') == [(0,)]
+
+
+def test_practitioner_moves_to_the_database_of_the_new_department(hospital):
+    assert run_cli('delete_appointment', {'PractitionerID': 111111})[0]
+    assert run_cli('modify_practitioner', {'EmployeeID': 111111}, {'DepartmentID': 2, 'Title': 'Surgeon'})[0]
+    assert shard_rows(1, 'SELECT COUNT(*) FROM Practitioners') == [(0,)]
+    assert sorted(shard_rows(0, 'SELECT EmployeeID, DepartmentID, Title FROM Practitioners')) == [
+        (111111, 2, 'Surgeon'), (111112, 2, 'Doctor')]
+    totals = {row['DepartmentID']: row['TotalPractitioners'] for row in get_rows('get_department')}
+    assert totals == {1: 0, 2: 2}
+    assert shard_rows(0, 'SELECT COUNT(*) FROM Migration_Intents') == [(0,)]
+    assert shard_rows(1, 'SELECT COUNT(*) FROM Migration_Intents') == [(0,)]
+
+
+def test_rows_are_moved_in_batches(hospital):
+    rows = [{'EmployeeID': 211200 + n, 'LastName': 'R', 'FirstName': 'F', 'DepartmentID': 1} for n in range(5)]
+    with hospital.get_engine(1).begin() as connection:
+        connection.execute(hospital_db.Reception.__table__.insert(), rows)
+    assert hospital_db.move_rows(hospital_db.Reception, 1, 0, rows, {'DepartmentID': 2}, batch_size=2) == 5
+    assert shard_rows(1, 'SELECT EmployeeID FROM Receptionists') == [(211111,)]
+    assert shard_rows(0, 'SELECT COUNT(*) FROM Receptionists WHERE DepartmentID = 2') == [(6,)]
+
+
+def test_interrupted_move_is_completed_by_recover_migrations(hospital, monkeypatch):
+    def crash(*args):
+        raise RuntimeError("crashed before the insert")
+    assert run_cli('delete_appointment', {'ReceptionistID': 211111})[0]
+    rows = [{'EmployeeID': 211111, 'LastName': 'Smith', 'FirstName': 'John', 'DepartmentID': 1}]
+    apply_migration_intent = hospital_db._apply_migration_intent
+    monkeypatch.setattr(hospital_db, '_apply_migration_intent', crash)
+    with pytest.raises(RuntimeError):
+        hospital_db.move_rows(hospital_db.Reception, 1, 0, rows, {'DepartmentID': 2})
+    # the rows are either in the source database or in an intent, never lost
+    assert shard_rows(1, 'SELECT COUNT(*) FROM Receptionists') == [(0,)]
+    assert shard_rows(1, 'SELECT COUNT(*) FROM Migration_Intents') == [(1,)]
+
+    monkeypatch.setattr(hospital_db, '_apply_migration_intent', apply_migration_intent)
+    success, output = run_cli('recover_migrations')
+    assert success, output
+    assert shard_rows(0, 'SELECT EmployeeID FROM Receptionists WHERE DepartmentID = 2 ORDER BY EmployeeID') == [
+        (211111,), (211112,)]
+    assert shard_rows(1, 'SELECT COUNT(*) FROM Migration_Intents') == [(0,)]
+    # running it again doesn't duplicate the rows
+    assert hospital_db.recover_migrations() == 0
@@ -0,0 +1,45 @@
+import csv
+import json
+
+import pytest
+
+import hospital_db
+
+from conftest import get_rows, run_cli
+
+
+def test_jsonl_has_one_object_per_row(hospital):
+    rows = get_rows('get_department')
+    assert sorted((row['DepartmentID'], row['DepartmentName']) for row in rows) == [(1, 'Cardiology'),
+                                                                                    (2, 'Neurology')]
+
+
+def test_csv_file_with_selected_columns(hospital, tmp_path):
+    path = tmp_path / 'appointments.csv'
+    success, output = run_cli('get_appointment', '--format', 'csv', '--output', str(path),
+                              '--columns', 'DepartmentID,AppointmentTime')
+    assert success, output
+    with open(path, newline='') as file:
+        rows = list(csv.reader(file))
+    assert rows[0] == ['DepartmentID', 'AppointmentTime']
+    assert sorted(rows[1:]) == [['1', '10:00:00'], ['2', '11:00:00']]
+
+
+def test_patient_of_lookups_with_a_format(hospital):
+    rows = get_rows('get_practitioners_for', '1000', '[EmployeeID, LastName]')
+    assert sorted(json.dumps(row, sort_keys=True) for row in rows) == [
+        '{"EmployeeID": 111111, "LastName": "Jones"}', '{"EmployeeID": 111112, "LastName": "Kim"}']
+
+
+def test_unknown_format_is_rejected(hospital):
+    success, output = run_cli('get_department', '--format', 'xml')
+    assert not success
+    assert 'must be one of jsonl, csv, parquet' in output
+
+
+@pytest.mark.skipif(hospital_db.pyarrow is None, reason="pyarrow is not installed")
+def test_parquet_file(hospital, tmp_path):
+    path = tmp_path / 'patients.parquet'
+    assert run_cli('get_patient', '--format', 'parquet', '--output', str(path))[0]
+    table = hospital_db.pyarrow.parquet.read_table(path)
+    assert table.num_rows == 2
@@ -0,0 +1,66 @@
+import threading
+
+import hospital_db
+
+from conftest import get_rows, run_cli, shard_rows
+
+
+def pair_counts(shard):
+    return dict(((patient_id, practitioner_id), count) for patient_id, practitioner_id, count in shard_rows(
+        shard, 'SELECT PatientID, PractitionerID, AppointmentCount FROM Patient_Of'))
+
+
+def test_pairs_are_kept_in_the_database_of_the_appointment(hospital):
+    assert pair_counts(0) == {(1000, 111112): 1}
+    assert pair_counts(1) == {(1000, 111111): 1}
+    rows = get_rows('get_practitioners_for', '1000')
+    assert sorted(row['EmployeeID'] for row in rows) == [111111, 111112]
+
+
+def test_counts_follow_appointments_and_reassignments(hospital):
+    assert run_cli('add_appointment', {'ReceptionistID': 211111, 'PatientID': 1000, 'PractitionerID': 111111,
+                                       'DepartmentID': 1, 'AppointmentDate': '2024-03-20',
+                                       'AppointmentTime': '10:00', 'Notes': ''})[0]
+    assert pair_counts(1) == {(1000, 111111): 2}
+    assert run_cli('delete_appointment', {'AppointmentDate': '2024-03-19', 'DepartmentID': 1})[0]
+    assert pair_counts(1) == {(1000, 111111): 1}
+    assert run_cli('delete_appointment', {'DepartmentID': 1})[0]
+    assert pair_counts(1) == {}
+    assert pair_counts(0) == {(1000, 111112): 1}
+
+
+def test_pair_deltas_add_new_pairs_and_remove_emptied_ones(hospital):
+    with hospital.get_engine(1).begin() as connection:
+        hospital_db.apply_pair_deltas(connection, {(1000, 111111): -1, (1000, 111113): 2})
+    assert pair_counts(1) == {(1000, 111113): 2}
+
+
+def test_concurrent_deltas_for_a_new_pair_add_up(hospital):
+    barrier = threading.Barrier(4, timeout=5)
+    errors = []
+
+    def add_one():
+        try:
+            barrier.wait()
+            with hospital.get_engine(0).begin() as connection:
+                hospital_db.apply_pair_deltas(connection, {(1000, 111119): 1})
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=add_one) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert pair_counts(0)[(1000, 111119)] == 4
+
+
+def test_refresh_recounts_pairs(hospital):
+    with hospital.get_engine(1).begin() as connection:
+        connection.exec_driver_sql('UPDATE Patient_Of SET AppointmentCount = 5')
+        hospital_db.refresh_derived_columns(connection, patient_practitioner_pairs=[(1000, 111111), (1000, 4)])
+    assert pair_counts(1) == {(1000, 111111): 1}
+    with hospital.get_engine(1).begin() as connection:
+        connection.exec_driver_sql('DELETE FROM Patient_Of')
+        hospital_db.refresh_derived_columns(connection, patient_practitioner_pairs=[(1000, 111111)])
+    assert pair_counts(1) == {(1000, 111111): 1}
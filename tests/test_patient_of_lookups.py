@@ -0,0 +1,52 @@
+import hospital_db
+
+from conftest import count_statements, get_rows, run_cli
+
+
+def add_patients_with_appointments(first_patient_id, count):
+    for patient_id in range(first_patient_id, first_patient_id + count):
+        assert run_cli('add_patient', {'PatientID': patient_id, 'LastName': f'Last{patient_id}', 'FirstName': 'F',
+                                       'DOB': '1990-01-01', 'Gender': 'Male', 'Insurance': '',
+                                       'PastProcedures': '', 'Notes': '', 'DepartmentID': 1})[0]
+        assert run_cli('add_appointment', {'ReceptionistID': 211111, 'PatientID': patient_id,
+                                           'PractitionerID': 111111, 'DepartmentID': 1,
+                                           'AppointmentDate': '2024-04-01',
+                                           'AppointmentTime': f'{patient_id % 24:02}:00', 'Notes': ''})[0]
+
+
+def test_get_patients_of_returns_the_patients_of_every_database(hospital):
+    add_patients_with_appointments(2000, 2)
+    rows = get_rows('get_patients_of', '111111')
+    assert sorted((row['PatientID'], row['DepartmentID']) for row in rows) == [(1000, 1), (2000, 1), (2001, 1)]
+    rows = get_rows('get_patients_of', '111111', '[FirstName, LastName]')
+    assert sorted(rows[0]) == ['FirstName', 'LastName']
+
+
+def test_lookups_use_a_fixed_number_of_statements(hospital):
+    with count_statements(hospital) as counts:
+        get_rows('get_patients_of', '111111')
+        get_rows('get_practitioners_for', '1000')
+        assert run_cli('get_patients_of', '111111')[0]
+    few = dict(counts)
+    add_patients_with_appointments(2000, 6)
+    with count_statements(hospital) as counts:
+        assert len(get_rows('get_patients_of', '111111')) == 7
+        get_rows('get_practitioners_for', '1000')
+        assert run_cli('get_patients_of', '111111')[0]
+    # no statement per patient or practitioner row
+    assert counts == few
+
+
+def test_formatted_rows_are_streamed_one_database_at_a_time(hospital):
+    sessions = hospital.get_sessions()
+    try:
+        with count_statements(hospital) as counts:
+            rows = hospital_db.PatientOf.stream_related_rows(
+                sessions, hospital_db.Practitioner, hospital_db.PatientOf.PatientID, 1000,
+                hospital_db.PatientOf.PractitionerID, ['EmployeeID', 'LastName'])
+            assert next(rows) == {'EmployeeID': 111112, 'LastName': 'Kim'}
+            assert counts == {0: 1, 1: 0}
+            assert list(rows) == [{'EmployeeID': 111111, 'LastName': 'Jones'}]
+    finally:
+        for session in sessions:
+            session.close()
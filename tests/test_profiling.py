@@ -0,0 +1,103 @@
+import threading
+import urllib.request
+
+import pytest
+
+import hospital_db
+
+from conftest import run_cli
+
+
+@pytest.fixture
+def metrics(monkeypatch):
+    """Turn the statement metrics on, starting from empty totals so the test only sees its own operations."""
+    monkeypatch.setitem(hospital_db.profile_settings, 'enabled', True)
+    monkeypatch.setattr(hospital_db, 'query_metrics', {})
+    monkeypatch.setattr(hospital_db, 'operation_metrics', {})
+
+
+def test_extract_options_keeps_the_positional_arguments():
+    argv, options = hospital_db.extract_options(
+        ['hospital_db.py', 'get_patient', '--profile', '{}', '--columns', 'LastName', 'extra'],
+        value_options=('columns',), flag_options=('profile',))
+    assert argv == ['hospital_db.py', 'get_patient', '{}', 'extra']
+    assert options == {'profile': True, 'columns': 'LastName'}
+
+
+def test_extract_options_without_a_value():
+    argv, options = hospital_db.extract_options(['hospital_db.py', 'get_patient', '--columns'],
+                                                value_options=('columns',))
+    assert argv == ['hospital_db.py', 'get_patient']
+    assert options == {'columns': None}
+
+
+def test_profile_reports_the_statements_by_database(hospital):
+    assert not hospital_db.profile_settings['enabled']
+    success, output = run_cli('get_patient', {'PatientID': 1000}, '--profile')
+    assert success
+    lines = output.splitlines()
+    report = lines.index(next(line for line in lines if line.startswith('Profile of get_patient:')))
+    assert [line.split(':')[0] for line in lines[report + 1:]] == ['Database 1', 'Database 2']
+    assert 'SELECT' in lines[report + 1]
+
+
+def test_profile_is_only_printed_when_asked(hospital, metrics):
+    assert 'Profile of' not in run_cli('get_patient', {'PatientID': 1000})[1]
+
+
+def test_metrics_count_the_operations_and_statements(hospital, metrics):
+    assert run_cli('get_department', {'DepartmentID': 2})[0]
+    assert run_cli('get_department', {'DepartmentID': 2})[0]
+    lines = hospital_db.metrics_text().splitlines()
+    assert '# TYPE hospital_db_operations_total counter' in lines
+    assert 'hospital_db_operations_total{operation="get_department"} 2' in lines
+    assert any(line.startswith('hospital_db_statements_total{operation="get_department",database="1"} ')
+               for line in lines)
+    assert '# TYPE hospital_db_slowest_statement_seconds gauge' in lines
+
+
+def test_disabled_profiling_records_no_statements(hospital, metrics, monkeypatch):
+    monkeypatch.setitem(hospital_db.profile_settings, 'enabled', False)
+    assert run_cli('get_department', {'DepartmentID': 2})[0]
+    assert hospital_db.query_metrics == {}
+    assert hospital_db.operation_metrics['get_department'][0] == 1
+
+
+def test_server_serves_the_metrics(server, metrics):
+    assert run_cli('get_department', {'DepartmentID': 1})[0]
+    with urllib.request.urlopen(f"http://127.0.0.1:{server.server_port}/metrics") as response:
+        assert response.headers['Content-Type'].startswith('text/plain')
+        body = response.read().decode('utf-8')
+    assert 'hospital_db_operations_total{operation="get_department"} 1' in body.splitlines()
+
+
+def test_unknown_operations_share_one_series(hospital, metrics):
+    assert not run_cli('get_everything\n"quoted"')[0]
+    assert not run_cli('drop_tables')[0]
+    assert hospital_db.operation_metrics['unknown'][0] == 2
+    assert 'hospital_db_operations_total{operation="unknown"} 2' in hospital_db.metrics_text().splitlines()
+
+
+def test_metric_labels_are_escaped(metrics):
+    hospital_db.operation_metrics['a"b\\c\nd'] = [1, 0.0]
+    assert 'hospital_db_operations_total{operation="a\\"b\\\\c\\nd"} 1' in hospital_db.metrics_text().splitlines()
+
+
+def test_statements_of_other_threads_are_not_attributed_to_the_operation(hospital, metrics):
+    started, finish = threading.Event(), threading.Event()
+
+    def other_operation():
+        profile = hospital_db.begin_profile('batch')
+        started.set()
+        finish.wait()
+        hospital_db.end_profile(profile)
+    thread = threading.Thread(target=other_operation)
+    thread.start()
+    started.wait()
+    try:
+        assert run_cli('get_patient', {'PatientID': 1000})[0]
+    finally:
+        finish.set()
+        thread.join()
+    assert {operation for operation, shard in hospital_db.query_metrics} == {'get_patient'}
+    assert {shard for operation, shard in hospital_db.query_metrics} == {0, 1}
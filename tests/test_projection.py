@@ -0,0 +1,44 @@
+import pytest
+
+import hospital_db
+
+from conftest import run_cli
+
+
+@pytest.fixture
+def sessions(hospital):
+    sessions = hospital.get_sessions()
+    yield sessions
+    for session in sessions:
+        session.close()
+
+
+def test_select_columns_returns_named_tuples_without_loading_objects(sessions):
+    rows = hospital_db.select_columns(sessions, hospital_db.Patient, ['PatientID', 'DepartmentID'])
+    assert sorted(rows) == [(1000, 1), (1000, 2)]
+    assert rows[0]._fields == ('PatientID', 'DepartmentID')
+    assert all(not session.identity_map for session in sessions)
+
+
+def test_select_columns_filters_and_returns_dicts(sessions):
+    rows = hospital_db.select_columns(sessions, hospital_db.Practitioner, ['LastName'], {'DepartmentID': 2},
+                                      as_dicts=True)
+    assert rows == [{'LastName': 'Kim'}]
+
+
+def test_select_columns_streams_with_yield_per(sessions):
+    rows = hospital_db.select_columns(sessions, hospital_db.Appointment, ['AppointmentTime'], yield_per=1)
+    assert not isinstance(rows, list)
+    assert sorted(str(row.AppointmentTime) for row in rows) == ['10:00:00', '11:00:00']
+
+
+def test_unknown_column_is_an_error(sessions):
+    with pytest.raises(Exception, match='unknown column'):
+        hospital_db.select_columns(sessions, hospital_db.Patient, ['Nope'])
+
+
+def test_columns_option_prints_only_those_columns(hospital):
+    success, output = run_cli('get_patient', '--columns', 'PatientID,LastName', {'DepartmentID': 1})
+    assert success
+    assert 'LastName: Brown' in output
+    assert 'Insurance' not in output
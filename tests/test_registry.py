@@ -0,0 +1,35 @@
+import hospital_db
+
+from conftest import run_cli
+
+
+def test_get_engine_reuses_one_pooled_engine_per_shard(shards):
+    assert shards.get_engine(0) is shards.get_engine(0)
+    assert shards.get_engine(0) is not shards.get_engine(1)
+    assert shards.get_engine(0).pool.size() == hospital_db.pool_settings['pool_size']
+
+
+def test_sessions_are_bound_to_their_shard_engine(shards):
+    session1, session2 = shards.get_sessions()
+    try:
+        assert session1.get_bind() is shards.get_engine(0)
+        assert session2.get_bind() is shards.get_engine(1)
+    finally:
+        session1.close()
+        session2.close()
+
+
+def test_operations_share_the_process_registry(shards):
+    engine = shards.get_engine(0)
+    assert run_cli('add_department', {'DepartmentID': 1, 'DepartmentName': 'Cardiology', 'TotalRooms': 10})[0]
+    assert run_cli('get_department')[0]
+    assert hospital_db.get_registry() is shards
+    assert shards.get_engine(0) is engine
+
+
+def test_reset_registry_picks_up_new_engine_urls(shards, tmp_path, monkeypatch):
+    monkeypatch.setattr(hospital_db, 'engine_urls', {0: f"sqlite:///{tmp_path / 'other1.sqlite'}",
+                                                     1: f"sqlite:///{tmp_path / 'other2.sqlite'}"})
+    hospital_db.reset_registry()
+    assert hospital_db.get_registry() is not shards
+    assert str(hospital_db.get_registry().get_engine(0).url).endswith('other1.sqlite')
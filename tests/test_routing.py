@@ -0,0 +1,32 @@
+import hospital_db
+
+from conftest import count_statements, get_rows, run_cli
+
+
+def test_route_shards():
+    assert hospital_db.route_shards({'DepartmentID': 2}, 2) == [0]
+    assert hospital_db.route_shards({'DepartmentID': 1}, 2) == [1]
+    assert hospital_db.route_shards({'LastName': 'Brown'}, 2) == [0, 1]
+    assert hospital_db.route_shards(None, 2) == [0, 1]
+
+
+def test_get_filtered_by_department_queries_one_database(hospital):
+    with count_statements(hospital) as counts:
+        rows = get_rows('get_patient', {'DepartmentID': 1})
+    assert [row['DepartmentID'] for row in rows] == [1]
+    assert counts[1] > 0
+    assert counts[0] == 0
+
+
+def test_get_without_department_queries_every_database(hospital):
+    with count_statements(hospital) as counts:
+        rows = get_rows('get_patient', {'LastName': 'Brown'})
+    assert sorted(row['DepartmentID'] for row in rows) == [1, 2]
+    assert counts[0] > 0 and counts[1] > 0
+
+
+def test_delete_filtered_by_department_leaves_the_other_database_alone(hospital):
+    with count_statements(hospital) as counts:
+        assert run_cli('delete_appointment', {'DepartmentID': 2})[0]
+    assert counts[1] == 0
+    assert [row['DepartmentID'] for row in get_rows('get_appointment')] == [1]
@@ -0,0 +1,99 @@
+import datetime
+import threading
+import time
+
+import pytest
+
+import hospital_db
+
+from conftest import get_rows
+
+
+def test_results_keep_the_task_order():
+    def slow():
+        time.sleep(0.05)
+        return 'first'
+    assert hospital_db.scatter_gather([slow, lambda: 'second']) == ['first', 'second']
+
+
+def test_tasks_run_concurrently():
+    barrier = threading.Barrier(2, timeout=5)
+    # each task waits for the other, which only returns if they run at the same time
+    assert hospital_db.scatter_gather([barrier.wait, barrier.wait]) is not None
+
+
+def test_error_is_raised_unless_partial_results_are_allowed():
+    def failing():
+        raise ValueError("database down")
+    with pytest.raises(ValueError):
+        hospital_db.scatter_gather([failing, lambda: 1])
+
+
+def test_partial_results_warn_on_stderr_with_the_database_number(capsys):
+    def failing():
+        raise ValueError("database down")
+    results = hospital_db.scatter_gather([lambda: 1, failing], allow_partial=True, shards=[1, 0])
+    assert results == [1, None]
+    captured = capsys.readouterr()
+    assert captured.out == ''
+    assert 'database 1 could not be queried' in captured.err
+
+
+def test_timed_out_task_is_kept_until_it_finishes(capsys):
+    release = threading.Event()
+    finished = threading.Event()
+
+    def stuck():
+        release.wait(5)
+        finished.set()
+    results = hospital_db.scatter_gather([lambda: 1, stuck], timeout=0.05, allow_partial=True)
+    assert results == [1, None]
+    assert 'database 2 did not respond' in capsys.readouterr().err
+    release.set()
+    hospital_db.wait_for_straggling_tasks()
+    assert finished.is_set()
+    assert not hospital_db.straggling_futures
+
+
+def test_gathered_rows_fail_unless_partial_rows_are_allowed(capsys):
+    def failing():
+        raise ValueError("database down")
+    with pytest.raises(ValueError):
+        hospital_db.gather_shard_rows([lambda: [1, 2], failing])
+    assert hospital_db.gather_shard_rows([lambda: [1, 2], failing], allow_partial=True) == [1, 2]
+    assert 'database 2 could not be queried' in capsys.readouterr().err
+
+
+def test_free_slots_fail_when_a_database_fails(hospital, monkeypatch):
+    def failing(tasks, timeout=None, allow_partial=False, shards=None, writes=False):
+        if not allow_partial:
+            raise ValueError("database down")
+        return [None] * len(tasks)
+    monkeypatch.setattr(hospital_db, 'scatter_gather', failing)
+    sessions = hospital.get_sessions()
+    try:
+        with pytest.raises(Exception, match='database down'):
+            hospital_db.Appointment.find_free_slots(sessions, datetime.date(2024, 3, 19), datetime.date(2024, 3, 19),
+                                                    department_id=None)
+    finally:
+        for session in sessions:
+            session.close()
+
+
+def test_writes_are_waited_for_past_the_timeout():
+    def slow_commit():
+        time.sleep(0.2)
+        return 'committed'
+    assert hospital_db.scatter_gather([slow_commit, lambda: 'committed'], timeout=0.01,
+                                      writes=True) == ['committed', 'committed']
+
+
+def test_get_merges_the_rows_of_both_databases(hospital):
+    rows = get_rows('get_appointment', {'AppointmentDate': '2024-03-19'})
+    assert sorted(row['DepartmentID'] for row in rows) == [1, 2]
+
+
+def test_modify_fans_out_to_both_databases(hospital):
+    assert hospital_db.run_operation(['hospital_db.py', 'modify_patient', '{"PatientID": 1000}',
+                                      '{"Insurance": "Kaiser"}'])
+    assert [row['Insurance'] for row in get_rows('get_patient')] == ['Kaiser', 'Kaiser']
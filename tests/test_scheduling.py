@@ -0,0 +1,51 @@
+import datetime
+import json
+
+import hospital_db
+
+from conftest import get_rows, run_cli, shard_rows
+
+
+def appointment(practitioner_id, dept_id, time, patient_id=1000):
+    receptionist_id = {1: 211111, 2: 211112}[dept_id]
+    return {'ReceptionistID': receptionist_id, 'PatientID': patient_id, 'PractitionerID': practitioner_id,
+            'DepartmentID': dept_id, 'AppointmentDate': '2024-03-19', 'AppointmentTime': time, 'Notes': ''}
+
+
+def test_clashes_are_rejected_before_inserting(hospital):
+    rows = [appointment(111111, 1, '10:00'), appointment(111111, 1, '10:30'), appointment(111111, 1, '10:30'),
+            appointment(111112, 2, '08:00')]
+    added, moved, rejected = hospital_db.schedule_appointments(enumerate(rows, 1))
+    assert added == 2
+    assert moved == []
+    assert [number for number, error in rejected] == [1, 3]
+    assert shard_rows(1, 'SELECT COUNT(*) FROM Appointments') == [(2,)]
+    assert shard_rows(1, 'SELECT AppointmentCount FROM Patient_Of') == [(2,)]
+
+
+def test_clashes_are_moved_to_the_next_free_slot(hospital):
+    rows = [appointment(111111, 1, '09:30'), appointment(111111, 1, '09:30'), appointment(111111, 1, '09:30')]
+    added, moved, rejected = hospital_db.schedule_appointments(enumerate(rows, 1), on_conflict='reslot')
+    assert added == 3
+    assert rejected == []
+    # 10:00 is already booked
+    assert [(number, str(new_time)) for number, new_time in moved] == [(2, '10:30:00'), (3, '11:00:00')]
+
+
+def test_full_day_is_rejected_when_reslotting(hospital, monkeypatch):
+    monkeypatch.setitem(hospital_db.slot_settings, 'day_start', datetime.time(10, 0))
+    monkeypatch.setitem(hospital_db.slot_settings, 'day_end', datetime.time(10, 30))
+    added, moved, rejected = hospital_db.schedule_appointments(enumerate([appointment(111111, 1, '10:00')], 1),
+                                                               on_conflict='reslot')
+    assert added == 0
+    assert [number for number, error in rejected] == [1]
+
+
+def test_command_line_reads_a_file(hospital, tmp_path):
+    path = tmp_path / 'appointments.jsonl'
+    path.write_text(''.join(json.dumps(row) + '\n' for row in [appointment(111112, 2, '11:00'),
+                                                               appointment(111112, 2, '12:00')]))
+    success, output = run_cli('schedule_appointments', str(path), '--on-conflict', 'reslot')
+    assert success, output
+    times = sorted(row['AppointmentTime'] for row in get_rows('get_appointment', {'DepartmentID': 2}))
+    assert times == ['11:00:00', '11:30:00', '12:00:00']
@@ -0,0 +1,56 @@
+import json
+import urllib.request
+
+import hospital_client
+import hospital_server
+
+
+def test_handle_rpc_runs_the_operation(hospital):
+    response = hospital_server.handle_rpc({'jsonrpc': '2.0', 'id': 7, 'method': 'get_department',
+                                           'params': [{'DepartmentID': 2}]})
+    assert response['id'] == 7
+    assert response['result']['success']
+    assert 'DepartmentName: Neurology' in response['result']['output']
+    assert 'Cardiology' not in response['result']['output']
+
+
+def test_handle_rpc_rejects_a_malformed_request(hospital):
+    response = hospital_server.handle_rpc({'jsonrpc': '2.0', 'id': 1, 'method': 'get_department', 'params': '{}'})
+    assert response['error']['code'] == -32600
+
+
+def test_handle_rpc_rejects_a_request_that_is_no_object(hospital):
+    for request in ('get_department', [], 7):
+        response = hospital_server.handle_rpc(request)
+        assert response['id'] is None
+        assert response['error']['code'] == -32600
+
+
+def test_handle_rpc_runs_a_batch(hospital):
+    responses = hospital_server.handle_rpc([{'jsonrpc': '2.0', 'id': 1, 'method': 'get_department',
+                                             'params': [{'DepartmentID': 1}]},
+                                            'get_department'])
+    assert [response['id'] for response in responses] == [1, None]
+    assert 'DepartmentName: Cardiology' in responses[0]['result']['output']
+    assert responses[1]['error']['code'] == -32600
+
+
+def test_batch_through_the_server(server):
+    request = json.dumps([{'jsonrpc': '2.0', 'id': n, 'method': 'get_department', 'params': [{'DepartmentID': n}]}
+                          for n in (1, 2)]).encode('utf-8')
+    with urllib.request.urlopen(f"http://127.0.0.1:{server.server_port}/rpc", request) as response:
+        responses = json.loads(response.read())
+    assert [response['result']['success'] for response in responses] == [True, True]
+
+
+def test_client_round_trip_through_the_server(server):
+    response = hospital_client.call('add_department', [{'DepartmentID': 3, 'DepartmentName': 'Oncology',
+                                                        'TotalRooms': 20}])
+    assert response['result']['success']
+    response = hospital_client.call('get_department', ['{"DepartmentID": 3}'])
+    assert 'DepartmentName: Oncology' in response['result']['output']
+
+
+def test_failed_operation_reports_no_success(server):
+    response = hospital_client.call('add_department', [{'DepartmentID': 1}])
+    assert not response['result']['success']
@@ -0,0 +1,62 @@
+import hospital_db
+
+from conftest import count_statements, get_rows, run_cli
+
+
+def add_appointments(count, first_hour=0):
+    for hour in range(first_hour, first_hour + count):
+        assert run_cli('add_appointment', {'ReceptionistID': 211111, 'PatientID': 1000, 'PractitionerID': 111111,
+                                           'DepartmentID': 1, 'AppointmentDate': '2024-05-01',
+                                           'AppointmentTime': f'{hour:02}:30', 'Notes': ''})[0]
+
+
+def statements_for(hospital, *args):
+    with count_statements(hospital) as counts:
+        success, output = run_cli(*args)
+    assert success, output
+    return counts[1]
+
+
+def test_modify_uses_the_same_statements_for_any_number_of_rows(hospital):
+    add_appointments(1)
+    one = statements_for(hospital, 'modify_appointment', {'AppointmentDate': '2024-05-01'}, {'Notes': 'a'})
+    add_appointments(5, first_hour=1)
+    many = statements_for(hospital, 'modify_appointment', {'AppointmentDate': '2024-05-01'}, {'Notes': 'b'})
+    assert many == one
+    assert {row['Notes'] for row in get_rows('get_appointment', {'AppointmentDate': '2024-05-01'})} == {'b'}
+
+
+def test_delete_uses_the_same_statements_for_any_number_of_rows(hospital):
+    add_appointments(1)
+    one = statements_for(hospital, 'delete_appointment', {'AppointmentDate': '2024-05-01'})
+    add_appointments(6)
+    many = statements_for(hospital, 'delete_appointment', {'AppointmentDate': '2024-05-01'})
+    assert many == one
+    assert get_rows('get_appointment', {'AppointmentDate': '2024-05-01'}) == []
+    # the derived columns are maintained by the set-based statements too
+    assert get_rows('get_patient', {'DepartmentID': 1})[0]['SchedulingState'] == 'Scheduled'
+
+
+def test_reassigning_appointments_keeps_patient_of_in_step(hospital):
+    add_appointments(3)
+    assert run_cli('modify_appointment', {'AppointmentDate': '2024-05-01'}, {'PractitionerID': 111113})[0]
+    rows = get_rows('get_practitioners_for', '1000')
+    assert sorted(row['EmployeeID'] for row in rows) == [111111, 111112]
+    assert [row['PatientID'] for row in get_rows('get_patients_of', '111111')] == [1000]
+
+
+def test_no_matching_rows_is_reported(hospital):
+    success, output = run_cli('delete_appointment', {'AppointmentDate': '2030-01-01'})
+    assert not success
+
+
+def test_staff_modifies_return_the_number_of_rows(hospital):
+    sessions = hospital.get_sessions()
+    try:
+        assert hospital_db.Practitioner.modify_practitioner(sessions, {'Title': 'Doctor'},
+                                                            {'Specialty': 'General'}) == 2
+        assert hospital_db.Reception.modify_receptionist(sessions, {'EmployeeID': 211111}, {'LastName': 'Miller'}) == 1
+        assert hospital_db.Reception.modify_receptionist(sessions, {'EmployeeID': 999999}, {'LastName': 'Miller'}) == 0
+    finally:
+        for session in sessions:
+            session.close()
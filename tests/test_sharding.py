@@ -0,0 +1,90 @@
+import hospital_db
+
+from conftest import get_rows, run_cli, shard_rows
+
+
+def test_two_databases_keep_the_department_id_modulo_placement():
+    departments = hospital_db.ShardMap([0, 1])
+    assert [departments.shard_for(dept_id) for dept_id in range(1, 7)] == [1, 0, 1, 0, 1, 0]
+
+
+def test_more_databases_use_the_ring_and_adding_one_moves_few_departments():
+    three = hospital_db.ShardMap([0, 1, 2])
+    four = hospital_db.ShardMap([0, 1, 2, 3])
+    assert {three.shard_for(dept_id) for dept_id in range(200)} == {0, 1, 2}
+    moved = [dept_id for dept_id in range(200) if three.shard_for(dept_id) != four.shard_for(dept_id)]
+    # only the departments that land on the new database's part of the ring move
+    assert all(four.shard_for(dept_id) == 3 for dept_id in moved)
+    assert len(moved) < 100
+
+
+def test_pinned_departments_take_precedence():
+    departments = hospital_db.ShardMap([0, 1])
+    departments.directory[3] = 0
+    assert departments.shard_for(3) == 0
+
+
+def test_new_departments_are_stored_and_pinned(hospital):
+    assert shard_rows(0, 'SELECT DepartmentID FROM Departments') == [(2,)]
+    assert shard_rows(1, 'SELECT DepartmentID FROM Departments') == [(1,)]
+    assert sorted(shard_rows(0, 'SELECT DepartmentID, ShardID FROM Shard_Directory')) == [(1, 1), (2, 0)]
+
+
+def test_init_schema_pins_existing_departments(hospital, tmp_path, monkeypatch):
+    with hospital.get_engine(0).begin() as connection:
+        connection.exec_driver_sql('DELETE FROM Shard_Directory')
+    assert run_cli('init_schema')[0]
+    assert sorted(shard_rows(0, 'SELECT DepartmentID, ShardID FROM Shard_Directory')) == [(1, 1), (2, 0)]
+
+    # a third database doesn't change where the existing departments are found
+    monkeypatch.setitem(hospital_db.engine_urls, 2, f"sqlite:///{tmp_path / 'database3.sqlite'}")
+    hospital_db.reset_registry()
+    assert run_cli('init_schema')[0]
+    assert [row['DepartmentName'] for row in get_rows('get_department', {'DepartmentID': 1})] == ['Cardiology']
+    assert [row['PatientID'] for row in get_rows('get_patient', {'DepartmentID': 2})] == [1000]
+
+
+def test_rebalance_department_moves_its_rows(hospital, monkeypatch):
+    monkeypatch.setitem(hospital_db.shard_settings, 'directory_ttl', 0)
+    success, output = run_cli('rebalance_department', '1', '0')
+    assert success, output
+    assert shard_rows(1, 'SELECT COUNT(*) FROM Appointments') == [(0,)]
+    assert shard_rows(0, 'SELECT DepartmentID FROM Appointments ORDER BY DepartmentID') == [(1,), (2,)]
+    assert hospital_db.hash_department(1) == 0
+    assert [row['LastName'] for row in get_rows('get_practitioner', {'DepartmentID': 1})] == ['Jones']
+
+
+def test_rebalance_refuses_writes_while_moving_and_copies_the_changes(hospital, monkeypatch):
+    monkeypatch.setitem(hospital_db.shard_settings, 'directory_ttl', 60)
+    copied, deleted, wait_seconds = hospital_db.rebalance_department(1, 0)
+    assert copied['Appointments'] == 1 and deleted == {} and wait_seconds == 60
+    success, output = run_cli('add_appointment', {'ReceptionistID': 211111, 'PatientID': 1000,
+                                                  'PractitionerID': 111111, 'DepartmentID': 1,
+                                                  'AppointmentDate': '2024-03-20', 'AppointmentTime': '10:00',
+                                                  'Notes': ''})
+    assert not success
+    assert 'Department 1 is being moved' in output
+    # writes to every database still change both copies
+    assert run_cli('modify_patient', {'PatientID': 1000}, {'Insurance': 'Kaiser'})[0]
+    # a process that hasn't reloaded the directory yet changes and deletes rows in the source database
+    with hospital.get_engine(1).begin() as connection:
+        connection.exec_driver_sql("UPDATE Practitioners SET Title = 'Surgeon' WHERE EmployeeID = 111111")
+        connection.exec_driver_sql("DELETE FROM Appointments WHERE DepartmentID = 1")
+    # the directory isn't switched before every process has seen the move
+    copied, deleted, wait_seconds = hospital_db.rebalance_department(1, 0)
+    assert copied == {} and 0 < wait_seconds <= 60
+
+    monkeypatch.setitem(hospital_db.shard_settings, 'directory_ttl', 0)
+    copied, deleted, wait_seconds = hospital_db.rebalance_department(1, 0)
+    assert (copied['Practitioners'], copied['Appointments'], wait_seconds) == (1, 1, 0)
+    assert shard_rows(0, 'SELECT Title FROM Practitioners WHERE EmployeeID = 111111') == [('Surgeon',)]
+    assert shard_rows(0, 'SELECT COUNT(*) FROM Appointments WHERE DepartmentID = 1') == [(0,)]
+    assert shard_rows(0, 'SELECT PractitionerID FROM Patient_Of') == [(111112,)]
+    assert shard_rows(0, 'SELECT Insurance FROM Patients') == [('Kaiser',), ('Kaiser',)]
+    assert hospital_db.hash_department_for_write(1) == 0
+    assert shard_rows(1, 'SELECT COUNT(*) FROM Practitioners') == [(1,)]
+
+    copied, deleted, wait_seconds = hospital_db.rebalance_department(1, 0)
+    assert deleted['Practitioners'] == 1 and wait_seconds is None
+    assert shard_rows(1, 'SELECT COUNT(*) FROM Practitioners') == [(0,)]
+    assert shard_rows(0, 'SELECT COUNT(*) FROM Department_Moves') == [(0,)]
@@ -0,0 +1,61 @@
+import json
+import os
+
+import pytest
+
+import hospital_db
+
+from conftest import run_cli
+
+
+@pytest.fixture
+def slow_log(shards, monkeypatch):
+    """Log every statement as slow, returns a function reading the logged entries."""
+    monkeypatch.setitem(hospital_db.slow_query_settings, 'enabled', True)
+    monkeypatch.setitem(hospital_db.slow_query_settings, 'threshold', 0)
+
+    def read_entries():
+        with open(hospital_db.slow_query_settings['path']) as file:
+            return [json.loads(line) for line in file]
+    yield read_entries
+    if hospital_db.slow_query_handler is not None:
+        hospital_db.slow_query_logger.removeHandler(hospital_db.slow_query_handler)
+        hospital_db.slow_query_handler.close()
+        hospital_db.slow_query_handler = None
+
+
+def test_log_is_off_by_default(hospital):
+    assert not hospital_db.slow_query_settings['enabled']
+    assert run_cli('get_patient', {'LastName': 'Brown'})[0]
+    assert not os.path.exists(hospital_db.slow_query_settings['path'])
+
+
+def test_parameters_are_redacted(hospital, slow_log):
+    assert run_cli('get_patient', {'LastName': 'Brown'})[0]
+    entries = [entry for entry in slow_log() if entry['operation'] == 'get_patient']
+    assert {entry['database'] for entry in entries} == {1, 2}
+    assert all(isinstance(entry['parameters'], str) and entry['parameters'].endswith(' redacted')
+               for entry in entries)
+    assert 'Brown' not in json.dumps(entries)
+
+
+def test_parameters_are_logged_when_asked(hospital, slow_log, monkeypatch):
+    monkeypatch.setitem(hospital_db.slow_query_settings, 'log_parameters', True)
+    assert run_cli('get_patient', {'LastName': 'Brown'})[0]
+    assert 'Brown' in json.dumps(slow_log())
+
+
+def test_explain_is_stored_for_selects(hospital, slow_log, monkeypatch):
+    monkeypatch.setitem(hospital_db.slow_query_settings, 'explain', True)
+    assert run_cli('get_patient', {'LastName': 'Brown'})[0]
+    selects = [entry for entry in slow_log() if entry['statement'].lstrip().startswith('SELECT')]
+    assert selects and all(entry['explain'] for entry in selects)
+    # the EXPLAIN statements themselves are not logged
+    assert not any(entry['statement'].startswith('EXPLAIN') for entry in slow_log())
+
+
+def test_changed_path_gets_a_new_file(hospital, slow_log, monkeypatch, tmp_path):
+    assert run_cli('get_department', {'DepartmentID': 2})[0]
+    monkeypatch.setitem(hospital_db.slow_query_settings, 'path', str(tmp_path / 'other.jsonl'))
+    assert run_cli('get_patient', {'LastName': 'Brown'})[0]
+    assert {entry['operation'] for entry in slow_log()} == {'get_patient'}
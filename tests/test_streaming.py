@@ -0,0 +1,48 @@
+import hospital_db
+
+from conftest import count_statements, run_cli
+
+
+def add_patients(dept_id, patient_ids):
+    for patient_id in patient_ids:
+        assert run_cli('add_patient', {'PatientID': patient_id, 'LastName': 'L', 'FirstName': 'F',
+                                       'DOB': '1990-01-01', 'Gender': 'Male', 'Insurance': '',
+                                       'PastProcedures': '', 'Notes': '', 'DepartmentID': dept_id})[0]
+
+
+def test_pages_are_merged_in_key_order(hospital):
+    add_patients(1, [1003, 1001])
+    add_patients(2, [1002])
+    sessions = hospital.get_sessions()
+    try:
+        key_columns = [hospital_db.Patient.DepartmentID, hospital_db.Patient.PatientID]
+        queries = [session.query(hospital_db.Patient) for session in sessions]
+        rows = hospital_db.stream_shard_rows(queries, key_columns, page_size=1)
+        assert [(row.DepartmentID, row.PatientID) for row in rows] == [(1, 1000), (1, 1001), (1, 1003),
+                                                                       (2, 1000), (2, 1002)]
+    finally:
+        for session in sessions:
+            session.close()
+
+
+def test_each_page_is_one_statement(hospital, monkeypatch):
+    add_patients(1, range(1001, 1006))
+    assert run_cli('get_patient')[0]  # fills the department cache
+    statements = {}
+    for page_size in (2, 100):
+        monkeypatch.setattr(hospital_db, 'stream_page_size', page_size)
+        with count_statements(hospital) as counts:
+            success, output = run_cli('get_patient', {'DepartmentID': 1})
+        assert success
+        assert output.count('Patient:') == 6
+        statements[page_size] = counts[1]
+    # three full pages and an empty one instead of one short page
+    assert statements[2] == statements[100] + 2
+
+
+def test_printed_rows_are_streamed_with_the_total(hospital, monkeypatch):
+    monkeypatch.setattr(hospital_db, 'stream_page_size', 1)
+    success, output = run_cli('get_appointment')
+    assert success
+    assert output.index('DepartmentID: 1') < output.index('DepartmentID: 2')
+    assert 'Total count of appointments that meet the search criteria: 2' in output
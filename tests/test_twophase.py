@@ -0,0 +1,110 @@
+import asyncio
+import os
+import time
+
+import pytest
+from sqlalchemy.dialects.sqlite.pysqlite import SQLiteDialect_pysqlite
+
+import hospital_db
+
+from conftest import get_rows, run_cli
+
+
+@pytest.fixture
+def xa_calls(monkeypatch):
+    """Let the SQLite stand-in go through the two-phase commit steps, recording the prepared transactions
+    that are committed or rolled back by xid."""
+    calls = {'prepared': [], 'committed': [], 'rolled_back': [], 'in_doubt': []}
+
+    def commit(self, connection, xid, is_prepared=True, recover=False):
+        calls['committed'].append(xid)
+        if not recover:
+            self.do_commit(connection.connection)
+
+    def rollback(self, connection, xid, is_prepared=True, recover=False):
+        calls['rolled_back'].append(xid)
+        if not recover:
+            self.do_rollback(connection.connection)
+    monkeypatch.setattr(SQLiteDialect_pysqlite, 'do_begin_twophase', lambda self, connection, xid: None)
+    monkeypatch.setattr(SQLiteDialect_pysqlite, 'do_prepare_twophase',
+                        lambda self, connection, xid: calls['prepared'].append(xid))
+    monkeypatch.setattr(SQLiteDialect_pysqlite, 'do_commit_twophase', commit)
+    monkeypatch.setattr(SQLiteDialect_pysqlite, 'do_rollback_twophase', rollback)
+    monkeypatch.setattr(SQLiteDialect_pysqlite, 'do_recover_twophase', lambda self, connection: calls['in_doubt'])
+    return calls
+
+
+def logged_decisions():
+    log_dir = hospital_db.twophase_settings['log_dir']
+    return os.listdir(log_dir) if os.path.isdir(log_dir) else []
+
+
+def test_fan_out_write_commits_both_databases_and_drops_its_decision(hospital, xa_calls):
+    assert run_cli('modify_patient', {'PatientID': 1000}, {'Insurance': 'Kaiser'})[0]
+    assert len(xa_calls['prepared']) == 2
+    assert xa_calls['committed'] == xa_calls['prepared']
+    assert [row['Insurance'] for row in get_rows('get_patient')] == ['Kaiser', 'Kaiser']
+    assert logged_decisions() == []
+
+
+def test_decision_is_kept_while_a_database_has_not_committed(hospital, xa_calls, monkeypatch, capsys):
+    commit = SQLiteDialect_pysqlite.do_commit_twophase
+
+    def fail_on_the_second_database(self, connection, xid, is_prepared=True, recover=False):
+        if xid == xa_calls['prepared'][1]:
+            raise RuntimeError("connection lost")
+        commit(self, connection, xid, is_prepared, recover)
+    monkeypatch.setattr(SQLiteDialect_pysqlite, 'do_commit_twophase', fail_on_the_second_database)
+    run_cli('modify_patient', {'PatientID': 1000}, {'Insurance': 'Kaiser'})
+    assert 'could not be queried' in capsys.readouterr().err
+    assert len(logged_decisions()) == 1
+
+
+def test_default_log_dir_does_not_depend_on_the_working_directory():
+    if 'HOSPITAL_TWOPHASE_LOG_DIR' not in os.environ:
+        assert hospital_db.twophase_settings['log_dir'] == os.path.join(os.path.dirname(hospital_db.__file__),
+                                                                        'twophase_log')
+
+
+def test_recover_twophase_finishes_in_doubt_transactions_and_clears_the_log(hospital, xa_calls, monkeypatch):
+    monkeypatch.setitem(hospital_db.twophase_settings, 'recover_after', 0)
+    hospital_db._log_twophase_decision(['_sa_committed'], 'commit')
+    xa_calls['in_doubt'].extend(['_sa_committed', '_sa_undecided', 'other_application'])
+    success, output = run_cli('recover_twophase')
+    assert success, output
+    # every database reports the in-doubt transactions in this stand-in
+    assert xa_calls['committed'] == ['_sa_committed', '_sa_committed']
+    assert xa_calls['rolled_back'] == ['_sa_undecided', '_sa_undecided']
+    assert logged_decisions() == []
+
+
+def test_recover_twophase_leaves_recent_transactions_alone(hospital, xa_calls):
+    recent = hospital_db._create_twophase_xid()
+    old = '_sa_%d_%032x' % (int(time.time()) - 3600, 1)
+    hospital_db._log_twophase_decision([recent], 'commit')
+    xa_calls['in_doubt'].extend([recent, old])
+    success, output = run_cli('recover_twophase')
+    assert success, output
+    assert xa_calls['committed'] == []
+    assert xa_calls['rolled_back'] == [old, old]
+    # the decision is still needed by the process committing it
+    assert len(logged_decisions()) == 1
+
+
+def test_prepared_transactions_use_dated_xids(hospital, xa_calls):
+    assert run_cli('modify_patient', {'PatientID': 1000}, {'Insurance': 'Kaiser'})[0]
+    assert all(0 <= hospital_db._twophase_xid_age(xid) < 60 for xid in xa_calls['prepared'])
+
+
+def test_async_fan_out_write_commits_both_databases_with_two_phase_commit(shards, xa_calls):
+    hospital_db_async = pytest.importorskip('hospital_db_async')
+    from test_async import add_hospital
+
+    async def test():
+        await add_hospital()
+        assert await hospital_db_async.modify_patient({'PatientID': 1000}, {'Insurance': 'Kaiser'}) == 2
+        await hospital_db_async.reset_async_registry()
+    asyncio.run(test())
+    assert len(xa_calls['prepared']) == 2
+    assert xa_calls['committed'] == xa_calls['prepared']
+    assert logged_decisions() == []